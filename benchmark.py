@@ -0,0 +1,197 @@
+"""
+Per-stage benchmarks for the solvers.
+
+    python benchmark.py run --out results.json
+    python benchmark.py compare baseline.json results.json --threshold 0.1
+
+Every case is seeded, so two runs on the same machine simulate the same
+states. compare exits with status 1 if any stage got slower than the
+threshold allows.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+fluidCases = [
+    # name, width, height, particles
+    ("60x20x3000", 60, 20, 3000),
+    ("120x40x12000", 120, 40, 12000),
+    ("240x80x48000", 240, 80, 48000),
+]
+staggeredCases = [
+    # name, rows, cols
+    ("50x100", 50, 100),
+    ("100x200", 100, 200),
+    ("200x400", 200, 400),
+]
+eulerianCases = [
+    ("30x30", 30),
+    ("60x60", 60),
+    ("100x100", 100),
+]
+
+def fluidStages(f):
+    # the stages of Fluid.sim() in order, sharing averageDensity like sim() does
+    state = {}
+    def updateDensity():
+        state["averageDensity"] = f.updateDensity(f.width, f.height)
+    stages = [("move", lambda: f.move(f.dt, f.width, f.height))]
+    if hasattr(f, "separateParticles"):
+        stages.append(("separateParticles", lambda: f.separateParticles(f.separationIters)))
+    stages += [
+        ("updateWaterUV", lambda: f.updateWaterUV(f.width, f.height)),
+        ("particlesToGrid", lambda: f.particlesToGrid(f.width, f.height)),
+        ("enforceSolidUV", f.enforceSolidUV),
+        ("updateDensity", updateDensity),
+        ("enforceIncompressability", lambda: f.enforceIncompressability(state["averageDensity"])),
+        ("gridToParticles", lambda: f.gridToParticles(f.width, f.height)),
+    ]
+    return stages
+
+def makeWater3(width, height, particles, seed):
+    from fluidsim import water3
+    random.seed(seed)
+    f = water3.Fluid(width, height, 2, 0.5, particles, 30)
+    return fluidStages(f)
+
+def makeWaterNumpy(width, height, particles, seed):
+    from fluidsim import waterNumpy
+    f = waterNumpy.Fluid(width, height, 2, 0.5, particles, 30, seed=seed)
+    return fluidStages(f)
+
+def makeStaggered(rows, cols, seed):
+    from fluidsim import eulerianStaggeredGrid
+    grid = eulerianStaggeredGrid.StaggeredGrid(rows, cols, seed=seed)
+    return [
+        ("handleGravity", lambda: grid.handleGravity(grid.timeStep)),
+        ("stopSolidBorders", grid.stopSolidBorders),
+        ("handleDivergence", grid.handleDivergence),
+        ("handleAdvection", lambda: grid.handleAdvection(grid.timeStep)),
+    ]
+
+def makeEulerian(size, seed):
+    from fluidsim import eulerianGrid
+    eulerianGrid.gridPoint.grid = []
+    eulerianGrid.gridPoint.initializeGrid(size, size)
+    return [("nextFrame", eulerianGrid.gridPoint.nextFrame)]
+
+def makeEulerianArray(size, seed):
+    from fluidsim.eulerianArrayGrid import ArrayGrid
+    grid = ArrayGrid(size, size)
+    return [("nextFrame", grid.nextFrame)]
+
+def benchmarks(quick=False):
+    # (solver, case, factory) for every benchmark, smallest first
+    for name, width, height, particles in fluidCases[:1 if quick else None]:
+        yield "waterNumpy", name, lambda seed, a=(width, height, particles): makeWaterNumpy(*a, seed)
+    for name, width, height, particles in fluidCases[:1 if quick else 2]:
+        # the list-based solver is too slow for the largest case
+        yield "water3", name, lambda seed, a=(width, height, particles): makeWater3(*a, seed)
+    for name, rows, cols in staggeredCases[:1 if quick else None]:
+        yield "staggered", name, lambda seed, a=(rows, cols): makeStaggered(*a, seed)
+    for name, size in eulerianCases[:1 if quick else None]:
+        yield "eulerian", name, lambda seed, a=size: makeEulerian(a, seed)
+        yield "eulerianArray", name, lambda seed, a=size: makeEulerianArray(a, seed)
+
+def timeStages(stages, warmup, repeats):
+    for _ in range(warmup):
+        for _, stage in stages:
+            stage()
+
+    times = {name: [] for name, _ in stages}
+    for _ in range(repeats):
+        for name, stage in stages:
+            start = time.perf_counter()
+            stage()
+            times[name].append(time.perf_counter() - start)
+    return times
+
+def run(args):
+    results = []
+    for solver, case, factory in benchmarks(args.quick):
+        if args.solvers and solver not in args.solvers:
+            continue
+        times = timeStages(factory(args.seed), args.warmup, args.repeats)
+        for stage, samples in times.items():
+            results.append({
+                "solver": solver,
+                "case": case,
+                "stage": stage,
+                "median": statistics.median(samples),
+                "min": min(samples),
+                "repeats": len(samples),
+            })
+            print("%-14s %-14s %-26s %10.3f ms" % (solver, case, stage, results[-1]["median"] * 1000))
+
+    with open(args.out, "w") as f:
+        json.dump({
+            "meta": {
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "system": platform.platform(),
+                "seed": args.seed,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "results": results,
+        }, f, indent=1)
+
+def compare(args):
+    def load(path):
+        with open(path) as f:
+            return {(r["solver"], r["case"], r["stage"]): r for r in json.load(f)["results"]}
+    baseline = load(args.baseline)
+    current = load(args.current)
+
+    regressions = 0
+    for key in sorted(baseline.keys() & current.keys()):
+        ratio = current[key]["median"] / baseline[key]["median"]
+        delta = current[key]["median"] - baseline[key]["median"]
+        flag = ""
+        if abs(delta) * 1000 < args.minDelta:
+            pass
+        elif ratio > 1 + args.threshold:
+            flag = "REGRESSION"
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            flag = "faster"
+        print("%-14s %-14s %-26s %10.3f -> %10.3f ms  x%.2f  %s" % (
+            *key, baseline[key]["median"] * 1000, current[key]["median"] * 1000, ratio, flag))
+    for key in sorted(baseline.keys() ^ current.keys()):
+        print("%-14s %-14s %-26s only in %s" % (*key, args.baseline if key in baseline else args.current))
+
+    print("%d regression(s) over %.0f%%" % (regressions, args.threshold * 100))
+    return 1 if regressions else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage solver benchmarks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    runParser = commands.add_parser("run", help="time every stage and write a results file")
+    runParser.add_argument("--out", default="benchmark.json")
+    runParser.add_argument("--seed", type=int, default=0)
+    runParser.add_argument("--warmup", type=int, default=3)
+    runParser.add_argument("--repeats", type=int, default=10)
+    runParser.add_argument("--solvers", nargs="*", help="only run these solvers")
+    runParser.add_argument("--quick", action="store_true", help="smallest case of each solver only")
+
+    compareParser = commands.add_parser("compare", help="flag regressions between two results files")
+    compareParser.add_argument("baseline")
+    compareParser.add_argument("current")
+    compareParser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown, 0.1 = 10%%")
+    compareParser.add_argument("--min-delta", dest="minDelta", type=float, default=0.05, help="ignore changes smaller than this many ms")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run(args)
+        return 0
+    return compare(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+"""
+Fluid solvers as an importable package.
+
+Importing fluidsim or any of its modules has no side effects and only needs
+NumPy; pygame is loaded by the front-ends (water4.py, pyGameGrid.py) and by
+ParticleRenderer.draw when they actually draw. The names below are imported
+from their modules on first use, so `import fluidsim` itself is cheap.
+"""
+import importlib
+
+exports = {
+    "Fluid": "waterNumpy",
+    "FluidEnsemble": "ensemble",
+    "StaggeredGrid": "eulerianStaggeredGrid",
+    "ArrayGrid": "eulerianArrayGrid",
+    "PressureSystem": "pressureSolvers",
+    "makePressureSolver": "pressureSolvers",
+    "saveCheckpoint": "checkpoint",
+    "loadCheckpoint": "checkpoint",
+    "StageProfiler": "profiling",
+    "GridRenderer": "gridRenderer",
+    "Recorder": "recording",
+    "Recording": "recording",
+    "FrameServer": "frameServer",
+    "FrameClient": "frameServer",
+}
+
+def __getattr__(name):
+    if name not in exports:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    return getattr(importlib.import_module("." + exports[name], __name__), name)
+
+def __dir__():
+    return sorted(list(globals()) + list(exports))
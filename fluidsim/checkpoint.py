@@ -0,0 +1,123 @@
+"""
+Binary checkpoints for waterNumpy.Fluid.
+
+Layout: a 64 byte preamble (magic, header offset, header length), then
+every array as raw bytes aligned to 64 bytes, then a JSON header that
+describes the arrays, the scalars, the constructor parameters and the RNG
+state. Arrays are read back with np.memmap, so nothing is parsed and large
+particle sets are paged in on first touch.
+"""
+import json
+import struct
+
+import numpy as np
+
+from .pressureSolvers import makePressureSolver, solvers
+from . import waterNumpy
+from .obstacles import ObstacleSet
+
+magic = b"FLUIDCK1"
+preamble = struct.Struct("<8sQQ")
+alignment = 64
+
+# constructor arguments restored as-is
+fluidParams = ("width", "height", "dt", "incompressibilityIters", "overCompression",
+               "particleRadius", "separationIters", "sortInterval", "cfl", "maxSubsteps", "compact",
+               "warmStart", "minPerCell", "maxPerCell")
+# attributes the constructor would otherwise derive or reset
+fluidScalars = ("numParticles", "gravity", "frame", "solverIterations", "solverResidual", "lastSubsteps")
+fluidArrays = ("particleX", "particleY", "particleU", "particleV",
+               "u", "v", "density", "pressure",
+               "notSolid", "notSolidU", "notSolidV", "solidU", "solidV",
+               "isWater", "isWaterU", "isWaterV", "waterCells")
+cellIndexArrays = ("cellStart", "order", "particleCell")
+
+def aligned(offset):
+    return -(-offset // alignment) * alignment
+
+def toJson(value):
+    # NumPy scalars are not JSON serialisable
+    return value.item() if isinstance(value, np.generic) else value
+
+def saveCheckpoint(fluid, path):
+    arrays = {name: getattr(fluid, name) for name in fluidArrays}
+    arrays.update({"cellIndex." + name: getattr(fluid.cellIndex, name) for name in cellIndexArrays})
+    arrays["obstacles.base"] = fluid.obstacles.base
+
+    solver = fluid.pressureSolver
+    header = {
+        "version": 1,
+        "params": {name: toJson(getattr(fluid, name)) for name in fluidParams},
+        "scalars": {name: toJson(getattr(fluid, name)) for name in fluidScalars},
+        "pressureSolver": {
+            "name": solver.name if solvers.get(getattr(solver, "name", None)) is type(solver) else None,
+            "options": {k: toJson(v) for k, v in vars(solver).items() if isinstance(toJson(v), (bool, int, float, str, type(None)))},
+        },
+        "rng": fluid.rng.bit_generator.state,
+        "obstacles": {"shapes": fluid.obstacles.describe(), "nextId": fluid.obstacles.nextId},
+        "arrays": {},
+    }
+
+    with open(path, "wb") as f:
+        f.write(bytes(alignment))
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            offset = aligned(f.tell())
+            f.write(bytes(offset - f.tell()))
+            f.write(array.tobytes())
+            header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+
+        headerBytes = json.dumps(header).encode("utf-8")
+        headerOffset = f.tell()
+        f.write(headerBytes)
+        f.seek(0)
+        f.write(preamble.pack(magic, headerOffset, len(headerBytes)))
+
+def readHeader(path):
+    with open(path, "rb") as f:
+        tag, headerOffset, headerLength = preamble.unpack(f.read(preamble.size))
+        if tag != magic:
+            raise ValueError("%s is not a fluid checkpoint" % path)
+        f.seek(headerOffset)
+        return json.loads(f.read(headerLength))
+
+def loadArray(path, spec, mmap):
+    dtype = np.dtype(spec["dtype"])
+    shape = tuple(spec["shape"])
+    if mmap and np.prod(shape) > 0:
+        # copy-on-write: the simulation can keep stepping without touching the file
+        return np.memmap(path, dtype=dtype, mode="c", offset=spec["offset"], shape=shape)
+    with open(path, "rb") as f:
+        f.seek(spec["offset"])
+        return np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+def loadCheckpoint(path, mmap=True, pressureSolver=None, profiler=None):
+    header = readHeader(path)
+
+    if pressureSolver is None and header["pressureSolver"]["name"] is not None:
+        pressureSolver = makePressureSolver(header["pressureSolver"]["name"], **header["pressureSolver"]["options"])
+    fluid = waterNumpy.Fluid(gravity=0, numParticles=0, pressureSolver=pressureSolver, profiler=profiler, **header["params"])
+
+    for name, value in header["scalars"].items():
+        setattr(fluid, name, value)
+    base = None
+    for name, spec in header["arrays"].items():
+        if name == "obstacles.base":
+            base = loadArray(path, spec, False)
+            continue
+        target = fluid
+        if name.startswith("cellIndex."):
+            target = fluid.cellIndex
+            name = name[len("cellIndex."):]
+        setattr(target, name, loadArray(path, spec, mmap))
+    fluid.rng.bit_generator.state = header["rng"]
+    if base is None:
+        # older checkpoints have no shapes: what they covered stays solid,
+        # as a still wall
+        fluid.obstacles = ObstacleSet(fluid.width, fluid.height, ~np.asarray(fluid.notSolid))
+        fluid.solidU = np.zeros_like(fluid.solidU)
+        fluid.solidV = np.zeros_like(fluid.solidV)
+    else:
+        fluid.obstacles = ObstacleSet(fluid.width, fluid.height, base)
+        fluid.obstacles.restore(header["obstacles"]["shapes"], header["obstacles"]["nextId"])
+    return fluid
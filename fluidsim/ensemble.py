@@ -0,0 +1,143 @@
+import numpy as np
+from .waterNumpy import Fluid
+
+class FluidEnsemble(Fluid):
+    """
+    N copies of one waterNumpy.Fluid scene advanced by a single sim() call.
+
+    The members are stacked on one tall grid, member k taking rows
+    k * (height + 1) .. k * (height + 1) + height - 1 with a solid row after
+    each, so every stage of Fluid runs once for all of them and the pressure
+    solve sees one block-diagonal system. Particles of member k are
+    particleX/Y/U/V[k * numParticles:(k + 1) * numParticles]; sorting by
+    cell keeps each member's particles in its own block.
+
+    The pressure solve treats every member as its own block (see
+    PressureSystem.setBlocks): convergence, step sizes and the
+    incompressibilityIters cap apply per member, so a member's result does
+    not depend on which others share the batch. solverIterations and
+    solverResidual report the worst member.
+
+    gravity may be one value or one per member, and seeds one per member.
+    Member results come out in the member's own coordinates through
+    memberParticles(), memberField() and memberDivergence().
+    """
+    # grid fields on u and v faces; every other grid field is per cell
+    uFields = ("u", "weightsU", "notSolidU", "solidU", "isWaterU")
+    vFields = ("v", "weightsV", "notSolidV", "solidV", "isWaterV")
+
+    def __init__(self, members, width, height, gravity, dt, numParticles, incompressibilityIters, seeds=None, **options):
+        if options.get("minPerCell") or options.get("maxPerCell"):
+            raise ValueError("members keep a fixed number of particles, reseeding is not supported")
+        self.members = members
+        self.memberHeight = height
+        self.particlesPerMember = numParticles
+        self.rowStride = height + 1
+        super().__init__(width, members * self.rowStride, 0, dt, members * numParticles, incompressibilityIters, **options)
+        if not hasattr(self.pressureSolver, "solveBlocks"):
+            raise ValueError("the %s solver cannot stop members separately" % self.pressureSolver.name)
+
+        seeds = [None] * members if seeds is None else list(seeds)
+        if len(seeds) != members:
+            raise ValueError("expected %d seeds, got %d" % (members, len(seeds)))
+        gravity = np.broadcast_to(np.asarray(gravity, dtype=float), (members,))
+        self.memberGravity = gravity * dt
+
+        # per-particle member offset and limits, in the member's own order
+        member = np.repeat(np.arange(members), numParticles)
+        self.offsetY = (member * self.rowStride).astype(self.dtype)
+        self.maxY = self.offsetY + (height - 1)
+        self.interpMaxY = self.offsetY + (height - 2)
+        self.gravity = np.repeat(self.memberGravity, numParticles).astype(self.dtype)
+        self.cellMember = np.arange(self.numCells) // (width * self.rowStride)
+
+        # the same draws a Fluid with that seed makes
+        for k, seed in enumerate(seeds):
+            rng = np.random.default_rng(seed)
+            block = slice(k * numParticles, (k + 1) * numParticles)
+            self.particleX[block] = rng.uniform(3, int(width/3*2)-4, numParticles)
+            self.particleY[block] = rng.uniform(3, height-4, numParticles) + k * self.rowStride
+
+    def initSolids(self):
+        # each member's walls plus the separating row below it
+        super().initSolids()
+        notSolid = self.notSolid.reshape(self.members, self.rowStride, self.width)
+        notSolid[:, self.memberHeight - 1:, :] = False
+        notSolid[:, 0, :] = False
+
+        notSolidU = np.ones((self.height, self.width+1), dtype=np.uint8)
+        notSolid = notSolid.reshape(self.height, self.width)
+        notSolidU[:, 1:] *= notSolid
+        notSolidU[:, :-1] *= notSolid
+        notSolidV = np.ones((self.height+1, self.width), dtype=np.uint8)
+        notSolidV[1:, :] *= notSolid
+        notSolidV[:-1, :] *= notSolid
+
+        self.notSolidU = notSolidU.ravel()
+        self.notSolidV = notSolidV.ravel()
+
+    def clampMembers(self):
+        # keep particles inside their own member, as Fluid.move does for one
+        clampY = (self.particleY < self.offsetY) | (self.particleY > self.maxY)
+        np.clip(self.particleY, self.offsetY, self.maxY, out=self.particleY)
+        self.particleV[clampY] = 0
+
+    def move(self, dt, width, height):
+        super().move(dt, width, height)
+        self.clampMembers()
+
+    def separateParticles(self, numIters):
+        super().separateParticles(numIters)
+        if numIters > 0:
+            np.clip(self.particleY, self.offsetY, self.maxY, out=self.particleY)
+
+    def interpWeights(self, width, height, x, y, isU=0):
+        return super().interpWeights(width, height, x, np.minimum(y, self.interpMaxY), isU)
+
+    def updateDensity(self, width, height):
+        # the mean water-cell density of each member, by cell
+        density = self.density
+        density.fill(0)
+        self.interp(width, height, self.particleX, self.particleY, 0, density, 0, 0, 1, 0, False)
+
+        waterCount = np.bincount(self.cellMember, self.isWater, self.members)
+        densityCount = np.bincount(self.cellMember, density * self.isWater, self.members)
+        return np.divide(densityCount, waterCount, out=np.zeros(self.members), where=waterCount > 0)
+
+    def pressureSystem(self):
+        system = super().pressureSystem()
+        system.setBlocks(self.cellMember[system.cells], self.members)
+        return system
+
+    def overDensity(self, cells, averageDensity):
+        average = averageDensity[self.cellMember[cells]]
+        return np.where(average > 0, np.maximum(self.density[cells] - average, 0), 0)
+
+    def memberBlock(self, k):
+        return slice(k * self.particlesPerMember, (k + 1) * self.particlesPerMember)
+
+    def memberParticles(self, k):
+        # copies of member k's particle x, y, u, v in its own coordinates
+        block = self.memberBlock(k)
+        return (self.particleX[block].copy(), self.particleY[block] - self.offsetY[block],
+                self.particleU[block].copy(), self.particleV[block].copy())
+
+    def memberField(self, name, k):
+        # member k's part of a grid field ("u", "v", "density", "pressure",
+        # "isWater", ...) as a view shaped like that member's own grid
+        field = getattr(self, name)
+        width, stride, height = self.width, self.rowStride, self.memberHeight
+        if name in self.uFields:
+            return field.reshape(self.members, stride, width + 1)[k, :height]
+        if name in self.vFields:
+            return field[:self.members * stride * width].reshape(self.members, stride, width)[k]
+        return field.reshape(self.members, stride, width)[k, :height]
+
+    def memberDivergence(self):
+        # calculateTotalDivergence for every member, as an array
+        cells = self.waterCells
+        y = cells // self.width
+        divergence = np.abs(self.u[cells + y + 1] - self.u[cells + y] + self.v[cells + self.width] - self.v[cells])
+        members = self.cellMember[cells]
+        total = np.bincount(members, divergence, self.members)
+        return total / np.maximum(np.bincount(members, minlength=self.members), 1)
@@ -0,0 +1,100 @@
+import numpy as np
+
+class ArrayGrid():
+    """
+    Whole-array version of the eulerianGrid.gridPoint model.
+
+    Fields are indexed [x, y] like gridPoint.grid[x][y]. Solids are a
+    boolean mask instead of gridPointSolid objects; solid cells hold zero
+    density and velocity, which is what gridPointSolid reports to its
+    neighbours. Every instance owns its own state.
+    """
+    def __init__(self, xDim, yDim, density=10000, gravity=(0, -0.098), otherForce=(0, 0), viscosityCoefficient=0.3, viscosity=False):
+        self.xDim = xDim
+        self.yDim = yDim
+        self.gravity = np.array(gravity, dtype=float) + otherForce
+        self.viscosityCoefficient = viscosityCoefficient
+        self.viscosity = viscosity
+
+        self.density = np.full((xDim, yDim), density, dtype=float)
+        self.densityTemp = np.zeros((xDim, yDim))
+        self.velocity = np.zeros((xDim, yDim, 2))
+        self.acceleration = np.zeros((xDim, yDim, 2))
+        self.solid = np.zeros((xDim, yDim), dtype=bool)
+
+        # nextFrame only visits cells inside the border
+        self.interior = np.zeros((xDim, yDim), dtype=bool)
+        self.interior[1:-1, 1:-1] = True
+        self.x, self.y = np.indices((xDim, yDim))
+
+        self.setSolid(np.s_[:, 0])
+        self.setSolid(np.s_[:, yDim-1])
+        self.setSolid(np.s_[0, :])
+        self.setSolid(np.s_[xDim-1, :])
+
+    def setSolid(self, cells):
+        # cells is anything that indexes an (xDim, yDim) array
+        self.solid[cells] = True
+        self.density[cells] = 0
+        self.velocity[cells] = 0
+        self.fluid = self.interior & ~self.solid
+
+    def neighbourSum(self, field):
+        # sum over the four axis neighbours; solids contribute their zero fields
+        total = np.zeros_like(field)
+        total[1:-1, 1:-1] = field[2:, 1:-1] + field[:-2, 1:-1] + field[1:-1, 2:] + field[1:-1, :-2]
+        return total
+
+    def calcPressure(self):
+        d = self.density
+        gradient = np.zeros_like(self.velocity)
+        gradient[1:-1, 1:-1, 0] = d[2:, 1:-1] - d[:-2, 1:-1]
+        gradient[1:-1, 1:-1, 1] = d[1:-1, 2:] - d[1:-1, :-2]
+        return np.divide(gradient, d[..., None], out=np.zeros_like(gradient), where=d[..., None] != 0)
+
+    def calcViscosity(self):
+        neighboursDensity = self.neighbourSum(self.density)
+        momentum = self.neighbourSum(self.velocity * self.density[..., None])
+        average = np.divide(momentum, neighboursDensity[..., None], out=self.velocity.copy(), where=neighboursDensity[..., None] != 0)
+        return self.viscosityCoefficient * (average - self.velocity)
+
+    def calcAcceleration(self):
+        acceleration = -self.calcPressure() + self.gravity
+        if self.viscosity:
+            acceleration += self.calcViscosity()
+        return acceleration
+
+    def fluidMover(self):
+        # move each fluid cell's density to the x and y neighbours its velocity
+        # points at, split by the velocity components
+        fluid = self.fluid
+        x, y = self.x[fluid], self.y[fluid]
+        velX, velY = self.velocity[fluid, 0], self.velocity[fluid, 1]
+        density = self.density[fluid]
+
+        targetX = (x + np.sign(velX).astype(int), y)
+        targetY = (x, y + np.sign(velY).astype(int))
+        solidX = self.solid[targetX]
+        solidY = self.solid[targetY]
+
+        speed = np.abs(velX) + np.abs(velY)
+        percentageX = np.divide(np.abs(velX), speed, out=np.zeros_like(speed), where=speed != 0)
+        percentageX = np.where(solidY, 1, np.where(solidX, 0, percentageX))
+        still = ((velX + velY) == 0) | (solidX & solidY)
+
+        toX = np.where(still, 0, density * percentageX)
+        toY = np.where(still, 0, density * (1 - percentageX))
+        size = self.xDim * self.yDim
+        self.densityTemp[:] = (np.bincount(np.ravel_multi_index(targetX, self.density.shape), toX, size) +
+                               np.bincount(np.ravel_multi_index(targetY, self.density.shape), toY, size)).reshape(self.density.shape)
+        self.densityTemp[fluid] += np.where(still, density, 0)
+
+    def nextFrame(self):
+        fluid = self.fluid
+        self.acceleration[fluid] = self.calcAcceleration()[fluid]
+
+        self.velocity[fluid] += self.acceleration[fluid]
+        self.fluidMover()
+
+        self.density[fluid] = self.densityTemp[fluid]
+        self.velocity[fluid & (self.density <= 0.001)] = 0
@@ -5,6 +5,7 @@ class gridPoint:
     grid = []
     gravity = np.array([0, -0.098], dtype=float)
     viscosityCoefficient = 0.3
+    debug = False
 
     def __init__(self, density, velocity, x, y):
         self.density = density
@@ -26,7 +27,8 @@ class gridPoint:
             gridPoint.grid.append(row)
         gridPoint.gravity += otherForce
 
-        print(gridPoint.grid[5][10].x, gridPoint.grid[5][10].y)
+        if gridPoint.debug:
+            print(gridPoint.grid[5][10].x, gridPoint.grid[5][10].y)
 
         for i in range(xDim):
             for j in range(yDim):
@@ -111,7 +113,7 @@ class gridPoint:
         return v
 
     def calcAcceleration(self):
-        if (self.x == 1) and self.y == 1:
+        if gridPoint.debug and (self.x == 1) and self.y == 1:
            self.printInfo()
            for n in self.neighbours:
                
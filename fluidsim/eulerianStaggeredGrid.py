@@ -0,0 +1,450 @@
+import numpy as np
+import time
+from .profiling import runStage
+from .pressureSolvers import PressureSystem
+from .parallelGrid import ParallelRedBlackSolver
+from .advection import AdvectionPlan
+from .obstacles import ObstacleSet
+
+class StaggeredGrid():
+    def __init__(self, rows=100, cols=200, gravity=(0.98, 0), timeStep=1, iterations=100, densityMultiplier=100, seed=None, debug=False, profiler=None, workers=None,
+                 cfl=None, maxSubsteps=16, tolerance=1e-4, checkInterval=5, diagnostics=None,
+                 warmStart=True):
+        self.rows = rows
+        self.cols = cols
+        self.gravity = np.array(gravity, dtype=np.float64)
+        self.timeStep = timeStep
+        # with cfl set, step() covers timeStep in as few substeps as keep
+        # every face velocity under cfl cells per substep
+        self.cfl = cfl
+        self.maxSubsteps = maxSubsteps
+        self.lastSubsteps = 1
+        self.iterations = iterations
+        # handleDivergence stops once the largest cell divergence is below
+        # tolerance, checked every checkInterval iterations; diagnostics, if
+        # given, is called as diagnostics(iteration, divergence) at each check
+        self.tolerance = tolerance
+        self.checkInterval = checkInterval
+        self.diagnostics = diagnostics
+        self.divergenceIterations = 0
+        self.divergenceNorm = 0.0
+        self.sweeps = None
+        # every sweep's per-cell correction is summed into pressure; with
+        # warmStart the next frame starts by applying it again
+        self.warmStart = warmStart
+        self.pressure = np.zeros((rows, cols), dtype=np.float64)
+        self.densityMultiplier = densityMultiplier
+        self.debug = debug
+        self.profiler = profiler
+        # workers > 0 splits divergence and advection across processes,
+        # stopping by the same test as the serial sweeps
+        self.parallel = ParallelRedBlackSolver(workers, sweepNorm=True) if workers else None
+        self.rng = np.random.default_rng(seed)
+
+        self.u = np.zeros((rows+1, cols), dtype=np.float64)
+        self.v = np.zeros((rows, cols+1), dtype=np.float64)
+
+        self.nonSolid = np.ones((rows, cols), dtype=int)
+        self.nonSolid[:,0] = 0
+        self.nonSolid[:,cols-1] = 0
+        self.nonSolid[0,:] = 0
+        self.nonSolid[rows-1,:] = 0
+        self.nonSolidMask = self.nonSolid.astype(bool)
+        self.nonSolidU = np.ones((rows+1, cols), dtype=int)
+        self.nonSolidV = np.ones((rows, cols+1), dtype=int)
+        self.nonSolidNeighbours = np.zeros((rows, cols), dtype=int)
+        # velocity of closed faces, non-zero next to moving obstacles
+        self.solidU = np.zeros((rows+1, cols), dtype=np.float64)
+        self.solidV = np.zeros((rows, cols+1), dtype=np.float64)
+
+        #red-black gauss seidel method for divergence handling
+        I, J = np.indices(self.nonSolid.shape)
+        self.redM = ((I + J) % 2 == 1).astype(bool) #    0,0 is false
+        self.blackM = ((I + J) % 2 == 0).astype(bool) #  0,0 is true
+
+        self.density = self.rng.standard_normal((rows, cols)) * densityMultiplier
+        # extra cell-centred fields carried along with density, see addScalar
+        self.scalars = {}
+        self.advectionPlan = AdvectionPlan(rows, cols)
+
+        self.updateSolids()
+        # shapes over (x=col, y=row); their x faces are v and their y faces u
+        self.obstacles = ObstacleSet(cols, rows, ~self.nonSolidMask)
+
+    def updateSolids(self):
+        nonSolid = self.nonSolid
+        nonSolidNeighbours = self.nonSolidNeighbours
+
+        self.nonSolidMask[:,:] = nonSolid.astype(bool)
+
+        nonSolidNeighbours[1:,:] = nonSolid[:-1:]
+        nonSolidNeighbours[:-1,:] += nonSolid[1:,:]
+        nonSolidNeighbours[:,1:] += nonSolid[:,:-1]
+        nonSolidNeighbours[:,:-1] += nonSolid[:,1:]
+
+        self.nonSolidU[:,:] = 1
+        self.nonSolidV[:,:] = 1
+        self.nonSolidU[1:,:] = nonSolid
+        self.nonSolidU[:-1,:] *= nonSolid
+        self.nonSolidV[:,1:] = nonSolid
+        self.nonSolidV[:,:-1] *= nonSolid
+
+        # the same faces seen as a pressure system over (x=col, y=row): v is
+        # the row-wise face array there and u the column-wise one
+        self.sweeps = None
+        self.pressure[~self.nonSolidMask] = 0
+        self.pressureSystem = PressureSystem(self.cols, self.rows, np.flatnonzero(self.nonSolidMask), self.nonSolidV.ravel(), self.nonSolidU.ravel())
+
+    def updateObstacles(self):
+        # refresh masks, neighbour counts and sweep weights around the cells
+        # the obstacles changed, leaving the rest of the grid alone
+        cells = self.obstacles.takeChanges()
+        if len(cells) == 0:
+            return
+        rows, cols = self.rows, self.cols
+        isOpen = ~self.obstacles.solid[cells]
+        self.nonSolid.reshape(-1)[cells] = isOpen
+        self.nonSolidMask.reshape(-1)[cells] = isOpen
+        self.pressure.reshape(-1)[cells[~isOpen]] = 0
+
+        facesV, openV, wallV = self.obstacles.xFaces(cells)
+        facesU, openU, wallU = self.obstacles.yFaces(cells)
+        self.nonSolidV.reshape(-1)[facesV] = openV
+        self.solidV.reshape(-1)[facesV] = wallV
+        self.nonSolidU.reshape(-1)[facesU] = openU
+        self.solidU.reshape(-1)[facesU] = wallU
+
+        # the changed cells and their four neighbours get new counts,
+        # gathered from each one's own neighbours
+        i, j = np.divmod(cells, cols)
+        i = np.concatenate((i, i - 1, i + 1, i, i))
+        j = np.concatenate((j, j, j, j - 1, j + 1))
+        inside = (i >= 0) & (i < rows) & (j >= 0) & (j < cols)
+        i, j = np.unique(np.stack((i[inside], j[inside])), axis=1)
+        counts = np.zeros(len(i), dtype=self.nonSolid.dtype)
+        for ni, nj in ((i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)):
+            inside = (ni >= 0) & (ni < rows) & (nj >= 0) & (nj < cols)
+            counts[inside] += self.nonSolid[ni[inside], nj[inside]]
+        self.nonSolidNeighbours[i, j] = counts
+
+        if self.sweeps is not None:
+            self.sweeps["openV"].reshape(-1)[facesV] = openV
+            self.sweeps["openU"].reshape(-1)[facesU] = openU
+            self.sweeps["fluid"][i, j] = self.nonSolidMask[i, j]
+            self.sweeps["inverse"][i, j] = np.divide(self.nonSolidMask[i, j], counts, out=np.zeros(len(counts)), where=counts > 0)
+        if self.parallel is not None:
+            # the parallel path is not incremental: it takes a whole new
+            # system, O(grid) per change, which the solver loads again
+            self.pressureSystem = PressureSystem(cols, rows, np.flatnonzero(self.nonSolidMask), self.nonSolidV.ravel(), self.nonSolidU.ravel())
+
+    def stopSolidBorders(self):
+        closedU = ~self.nonSolidU.astype(bool)
+        closedV = ~self.nonSolidV.astype(bool)
+        self.u[closedU] = self.solidU[closedU]
+        self.v[closedV] = self.solidV[closedV]
+        self.density[~self.nonSolidMask] = 0
+        for field in self.scalars.values():
+            field[~self.nonSolidMask] = 0
+
+    def handleGravity(self, timeStep):
+        self.u += self.gravity[0] * timeStep
+        self.v += self.gravity[1] * timeStep
+
+    def printProbe(self, label):
+        # state of the cell at (98, 1), used while debugging the solver
+        u, v = self.u, self.v
+        nonSolidNeighbours, nonSolidU = self.nonSolidNeighbours, self.nonSolidU
+        print(label, u[98,1], u[99,1], v[98,2], v[98,1], nonSolidNeighbours[98,1])
+        print(                          (u[98,1]-u[99,1]+v[98,2]-v[98,1])/nonSolidNeighbours[98,1])
+        print(u[98,1]+(nonSolidU[98,1]* (u[98,1]-u[99,1]+v[98,2]-v[98,1])/nonSolidNeighbours[98,1]))
+        print(u[98,1]-(nonSolidU[98,1]* (u[98,1]-u[99,1]+v[98,2]-v[98,1])/nonSolidNeighbours[98,1]))
+        print(nonSolidU[98,1])
+        print("")
+
+    def handleParallelDivergence(self):
+        system = self.pressureSystem
+        u, v = self.u.reshape(-1), self.v.reshape(-1)
+        cellPressure = self.pressure.reshape(-1)
+        guess = cellPressure[system.cells] if self.warmStart else None
+        parallel = self.parallel
+        parallel.tolerance, parallel.checkInterval, parallel.diagnostics = self.tolerance, self.checkInterval, self.diagnostics
+        pressure, self.divergenceIterations, self.divergenceNorm = parallel.solve(system, system.divergence(v, u), self.iterations, guess)
+        system.applyPressure(v, u, pressure)
+        cellPressure[system.cells] = pressure
+
+    def checkerboard(self):
+        # red (i+j odd) and black cells as two strided quarter-grids each.
+        # Every entry holds views of this cell set's four faces, its weights
+        # and its own work buffers, so a sweep only runs in-place ufuncs.
+        rows, cols = self.rows, self.cols
+        nonSolidU = self.nonSolidU.astype(np.float64)
+        nonSolidV = self.nonSolidV.astype(np.float64)
+        inverse = np.divide(self.nonSolidMask, self.nonSolidNeighbours, out=np.zeros((rows, cols)), where=self.nonSolidNeighbours > 0)
+        fluid = self.nonSolidMask.astype(np.float64)
+
+        colours = []
+        for starts in (((0, 1), (1, 0)), ((0, 0), (1, 1))):
+            quarters = []
+            for i0, j0 in starts:
+                cells = np.s_[i0:rows:2, j0:cols:2]
+                uHigh = np.s_[i0+1:rows+1:2, j0:cols:2]
+                vHigh = np.s_[i0:rows:2, j0+1:cols+1:2]
+                if self.u[cells].size == 0:
+                    continue
+                quarters.append({
+                    "pressure": self.pressure[cells],
+                    "uLow": self.u[cells], "uHigh": self.u[uHigh],
+                    "vLow": self.v[cells], "vHigh": self.v[vHigh],
+                    "openULow": nonSolidU[cells], "openUHigh": nonSolidU[uHigh],
+                    "openVLow": nonSolidV[cells], "openVHigh": nonSolidV[vHigh],
+                    "inverse": inverse[cells], "fluid": fluid[cells],
+                    "divergence": np.zeros(self.u[cells].shape), "scratch": np.zeros(self.u[cells].shape),
+                })
+            colours.append(quarters)
+        return {"u": self.u, "v": self.v, "colours": colours,
+                "openU": nonSolidU, "openV": nonSolidV, "inverse": inverse, "fluid": fluid,
+                "scratch": np.zeros((rows, cols))}
+
+    def applyPressure(self, pressure):
+        # the face corrections of all cells at once, each cell acting like a
+        # sweep update of size pressure[cell]
+        sweeps, u, v = self.sweeps, self.u, self.v
+        scratch, openU, openV = sweeps["scratch"], sweeps["openU"], sweeps["openV"]
+        np.multiply(pressure, openU[:-1,:], out=scratch)
+        u[:-1,:] += scratch
+        np.multiply(pressure, openU[1:,:], out=scratch)
+        u[1:,:] -= scratch
+        np.multiply(pressure, openV[:,:-1], out=scratch)
+        v[:,:-1] += scratch
+        np.multiply(pressure, openV[:,1:], out=scratch)
+        v[:,1:] -= scratch
+
+    def sweep(self, quarters, measure):
+        # one half-sweep over cells of one colour; none of them share a face
+        norm = 0.0
+        for q in quarters:
+            divergence, scratch = q["divergence"], q["scratch"]
+            np.subtract(q["uHigh"], q["uLow"], out=divergence)
+            divergence += q["vHigh"]
+            divergence -= q["vLow"]
+            if measure:
+                np.abs(divergence, out=scratch)
+                scratch *= q["fluid"]
+                norm = max(norm, float(scratch.max()))
+            divergence *= q["inverse"]
+            q["pressure"] += divergence
+
+            np.multiply(divergence, q["openULow"], out=scratch)
+            q["uLow"] += scratch
+            np.multiply(divergence, q["openUHigh"], out=scratch)
+            q["uHigh"] -= scratch
+            np.multiply(divergence, q["openVLow"], out=scratch)
+            q["vLow"] += scratch
+            np.multiply(divergence, q["openVHigh"], out=scratch)
+            q["vHigh"] -= scratch
+        return norm
+
+    def handleDivergence(self):
+        if self.parallel is not None:
+            return self.handleParallelDivergence()
+        if self.debug:
+            return self.handleMaskedDivergence()
+
+        if self.sweeps is None or self.sweeps["u"] is not self.u or self.sweeps["v"] is not self.v:
+            self.sweeps = self.checkerboard()
+        red, black = self.sweeps["colours"]
+
+        if self.warmStart:
+            self.applyPressure(self.pressure)
+        else:
+            self.pressure.fill(0)
+
+        # the norm is the largest divergence either colour had just before
+        # its half-sweep
+        self.divergenceIterations = 0
+        self.divergenceNorm = 0.0
+        for i in range(self.iterations):
+            measure = i % self.checkInterval == 0
+            norm = self.sweep(red, measure)
+            norm = max(norm, self.sweep(black, measure))
+            self.divergenceIterations += 1
+            if measure:
+                self.divergenceNorm = norm
+                if self.diagnostics is not None:
+                    self.diagnostics(i, norm)
+                if norm < self.tolerance:
+                    break
+
+    def handleMaskedDivergence(self):
+        # the original boolean-mask sweep, kept for the debug probes; it does
+        # not track pressure
+        u, v = self.u, self.v
+        nonSolidNeighbours, nonSolidU, nonSolidV = self.nonSolidNeighbours, self.nonSolidU, self.nonSolidV
+        divergence = np.zeros((self.rows, self.cols), dtype=np.float64)
+        redMask = self.redM & self.nonSolidMask
+        blackMask = self.blackM & self.nonSolidMask
+
+        for i in range(self.iterations): #increase this number to reduce divergence
+
+            if self.debug:
+                self.printProbe("u original 1")
+            divergence[redMask] = ( u[1:,:][redMask] - u[:-1,:][redMask] + v[:,1:][redMask] - v[:,:-1][redMask] ) / nonSolidNeighbours[redMask]
+
+            if self.debug:
+                print(u)
+            u[:-1,:][redMask] += divergence[redMask] * nonSolidU[:-1,:][redMask]
+            if self.debug:
+                print(divergence)
+                print(u)
+
+            u[1:,:][redMask] -= divergence[redMask] * nonSolidU[1:,:][redMask]
+
+            v[:,:-1][redMask] += divergence[redMask] * nonSolidV[:,:-1][redMask]
+            v[:,1:][redMask] -= divergence[redMask] * nonSolidV[:,1:][redMask]
+            if self.debug:
+                self.printProbe("u original 2")
+
+            divergence[blackMask] = ( u[1:,:][blackMask] - u[:-1,:][blackMask] + v[:,1:][blackMask] - v[:,:-1][blackMask] ) / nonSolidNeighbours[blackMask]
+            u[:-1,:][blackMask] += divergence[blackMask] * nonSolidU[:-1,:][blackMask]
+            u[1:,:][blackMask] -= divergence[blackMask] * nonSolidU[1:,:][blackMask]
+            v[:,:-1][blackMask] += divergence[blackMask] * nonSolidV[:,:-1][blackMask]
+            v[:,1:][blackMask] -= divergence[blackMask] * nonSolidV[:,1:][blackMask]
+
+    def testDivergence(self):
+        #Test case for handleDivergence
+        rows, cols = self.rows, self.cols
+        self.u = np.random.randn(rows + 1, cols) * 0.1   # x-face velocities
+        self.v = np.random.randn(rows, cols + 1) * 0.1   # y-face velocities
+        self.updateSolids()
+        self.stopSolidBorders()
+        u, v = self.u, self.v
+        div_before = (u[1:,:] - u[:-1,:]) + (v[:,1:] - v[:,:-1])
+        self.handleDivergence()
+        div_after = (u[1:,:] - u[:-1,:]) + (v[:,1:] - v[:,:-1])
+        print("Mean absolute divergence before:", np.sum(np.abs(div_before)) / np.sum(self.nonSolid))
+        print("Mean absolute divergence after: ", np.sum(np.abs(div_after)) / np.sum(self.nonSolid))
+        print("Reduction factor:", np.sum(np.abs(div_before)) / np.sum(np.abs(div_after)))
+
+    def addScalar(self, name, values=0.0):
+        # dye, temperature, ...: advected with density at the cost of one
+        # gather per field
+        self.scalars[name] = np.array(np.broadcast_to(values, (self.rows, self.cols)), dtype=np.float64)
+        return self.scalars[name]
+
+    # semi-legrangian advection method
+    def handleAdvection(self, timeStep):
+        u, v = self.u, self.v
+        plan = self.advectionPlan
+
+        #face centered velocities
+        velocityU, velocityV = plan.velocityU, plan.velocityV
+        np.add(u[1:,:], u[:-1,:], out=velocityU)
+        velocityU *= 0.5
+        np.add(v[:,1:], v[:,:-1], out=velocityV)
+        velocityV *= 0.5
+
+        fields = [self.density, *self.scalars.values()]
+        if self.parallel is not None:
+            pool = self.parallel.poolFor(self.pressureSystem)
+            for field in fields:
+                pool.advect(field, velocityU, velocityV, timeStep)
+            return
+
+        plan.trace(velocityU, velocityV, timeStep)
+        for field in fields:
+            plan.sample(field)
+
+    def meanDivergence(self):
+        u, v = self.u, self.v
+        divergence = (u[1:,:] - u[:-1,:]) + (v[:,1:] - v[:,:-1])
+        return float(np.abs(divergence[self.nonSolidMask]).mean())
+
+    def maxSpeed(self):
+        return float(max(np.abs(self.u).max(), np.abs(self.v).max()))
+
+    def substepSize(self, remaining):
+        if not self.cfl:
+            return remaining
+        speed = self.maxSpeed() + np.abs(self.gravity).max() * remaining
+        steps = min(max(int(np.ceil(speed * remaining / self.cfl)), 1), self.maxSubsteps - self.lastSubsteps)
+        return remaining / steps
+
+    def step(self):
+        stage = runStage if self.profiler is None else self.profiler.stage
+
+        stage("updateObstacles", self.updateObstacles)
+
+        self.lastSubsteps = 0
+        remaining = self.timeStep
+        while remaining > 1e-9 * self.timeStep:
+            timeStep = self.substepSize(remaining)
+            self.lastSubsteps += 1
+            stage("handleGravity", self.handleGravity, timeStep)
+            stage("stopSolidBorders", self.stopSolidBorders)
+            stage("handleDivergence", self.handleDivergence)
+            stage("handleAdvection", self.handleAdvection, timeStep)
+            remaining -= timeStep
+
+        if self.profiler is not None:
+            self.profiler.endStep(solverIterations=self.divergenceIterations, divergence=self.meanDivergence(),
+                                  substeps=self.lastSubsteps)
+
+    def close(self):
+        if self.parallel is not None:
+            self.parallel.close()
+
+    def densitySurface(self):
+        return np.uint8(255 / (1 + np.exp(-self.density/self.densityMultiplier)))
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="StaggeredGrid density in a pygame window.")
+    parser.add_argument("--serve", type=int, help="also publish every step on this local port, see watch.py")
+    args = parser.parse_args(argv)
+
+    import pygame
+
+    grid = StaggeredGrid()
+    server = None
+    if args.serve is not None:
+        from .frameServer import FrameServer
+        server = FrameServer(grid, ("u", "v", "density"), port=args.serve, meta={"densityScale": grid.densityMultiplier})
+        print("serving frames on port %d" % server.port)
+
+    pygame.init()
+    screen = pygame.display.set_mode((grid.rows, grid.cols))
+
+    running = True
+    count = 0
+    while running:
+
+        grid.step()
+        if server is not None:
+            server.publish()
+
+        densitySurface = grid.densitySurface()
+        surface = pygame.surfarray.make_surface(np.stack([densitySurface]*3, axis=-1))
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+        screen.blit(surface, (0, 0))
+        pygame.display.flip()
+
+        time.sleep(0.2)
+        count += 1
+
+        #for j in range(95,101):
+        #    for i in range(0,3):
+        #        print(u[j][i], end='\t')
+        #    print("")
+        #print("\n\n")
+        if count > 50:
+            running = False
+
+    pygame.quit()
+    if server is not None:
+        server.close()
+
+if __name__ == "__main__":
+    main()
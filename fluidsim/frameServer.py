@@ -0,0 +1,243 @@
+"""
+Serve a running simulation's frames to any number of local clients.
+
+The simulation calls FrameServer.publish() after each step. That copies the
+fields some client asked for and leaves the copy in every subscriber's
+one-frame mailbox; each subscriber has its own thread that encodes and
+sends whatever its mailbox holds. publish() never waits on a socket, so a
+slow client only sees fewer frames (counted in `dropped`).
+
+Protocol, over TCP on localhost: the client sends one JSON line
+
+    {"fields": ["density"], "every": 2, "stride": 4}
+
+(every: only steps divisible by it, stride: keep every stride-th element
+along each axis). The server answers with messages made of a preamble
+(header length, payload length), a JSON header and the raw array bytes.
+The first message describes the available fields and the server's meta,
+the rest are frames with {"step", "dropped", "arrays"}; the client sends
+one byte after each frame to ask for the next.
+"""
+import json
+import socket
+import struct
+import threading
+
+import numpy as np
+
+preamble = struct.Struct("<IQ")
+
+def sendMessage(connection, header, arrays=()):
+    header = dict(header)
+    payload = []
+    offset = 0
+    header["arrays"] = {}
+    for name, array in arrays:
+        array = np.ascontiguousarray(array)
+        header["arrays"][name] = [array.dtype.str, list(array.shape), offset]
+        payload.append(array)
+        offset += array.nbytes
+    headerBytes = json.dumps(header).encode("utf-8")
+    connection.sendall(preamble.pack(len(headerBytes), offset) + headerBytes)
+    for array in payload:
+        connection.sendall(memoryview(array).cast("B"))
+
+def receiveExactly(connection, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = connection.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("frame server closed the connection")
+        received += count
+    return buffer
+
+def receiveMessage(connection):
+    headerLength, payloadLength = preamble.unpack(receiveExactly(connection, preamble.size))
+    header = json.loads(receiveExactly(connection, headerLength))
+    payload = receiveExactly(connection, payloadLength)
+    arrays = {}
+    for name, (dtype, shape, offset) in header.pop("arrays").items():
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(payload, dtype=dtype, count=count, offset=offset).reshape(shape)
+    return header, arrays
+
+
+class Subscriber(threading.Thread):
+    # one client: its subscription, mailbox and sending thread
+    def __init__(self, server, connection):
+        super().__init__(daemon=True)
+        self.server = server
+        self.connection = connection
+        self.fields = ()
+        self.every = 1
+        self.stride = 1
+        self.pending = None
+        self.dropped = 0
+        self.ready = threading.Condition()
+        self.closed = False
+
+    def offer(self, step, frame):
+        if step % self.every:
+            return
+        with self.ready:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = (step, frame)
+            self.ready.notify()
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+
+    def subscribe(self):
+        with self.connection.makefile("rb") as stream:
+            line = stream.readline()
+        request = json.loads(line or b"{}")
+        fields = request.get("fields") or list(self.server.names)
+        unknown = set(fields) - set(self.server.names)
+        if unknown:
+            raise ValueError("unknown fields %s" % sorted(unknown))
+        self.every = max(int(request.get("every", 1)), 1)
+        self.stride = max(int(request.get("stride", 1)), 1)
+        self.fields = tuple(fields)
+
+    def run(self):
+        try:
+            self.subscribe()
+            sendMessage(self.connection, {"meta": self.server.meta, "fields": self.server.describe()})
+            self.server.attach(self)
+            while True:
+                with self.ready:
+                    while self.pending is None and not self.closed:
+                        self.ready.wait()
+                    if self.closed:
+                        return
+                    (step, frame), self.pending = self.pending, None
+                    dropped = self.dropped
+                stride = (slice(None, None, self.stride),)
+                sendMessage(self.connection, {"step": step, "dropped": dropped},
+                            ((name, frame[name][stride * frame[name].ndim]) for name in self.fields))
+                # wait for the client to take it, so frames queue here, where
+                # newer ones replace them, and not in the socket buffers
+                receiveExactly(self.connection, 1)
+        except ValueError as e:
+            try:
+                sendMessage(self.connection, {"error": str(e)})
+            except OSError:
+                pass
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            self.server.detach(self)
+            self.connection.close()
+
+
+class FrameServer():
+    """
+    Publishes the named attributes of `source` to subscribers on
+    host:port (port 0 picks a free one, see self.port). shapes maps a
+    name to the shape its flat array is reshaped to before sending, so
+    strides apply per axis. meta goes to every client on connect.
+    """
+    def __init__(self, source, names, port=0, host="127.0.0.1", shapes=None, meta=None):
+        self.source = source
+        self.names = tuple(names)
+        self.shapes = dict(shapes or {})
+        self.meta = dict(meta or {})
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.step = 0
+
+        self.listener = socket.create_server((host, port))
+        self.port = self.listener.getsockname()[1]
+        self.acceptor = threading.Thread(target=self.accept, daemon=True)
+        self.acceptor.start()
+
+    def accept(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                return
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            Subscriber(self, connection).start()
+
+    def attach(self, subscriber):
+        with self.lock:
+            self.subscribers.append(subscriber)
+
+    def detach(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def field(self, name):
+        value = np.asarray(getattr(self.source, name))
+        return value.reshape(self.shapes[name]) if name in self.shapes else value
+
+    def describe(self):
+        return {name: [self.field(name).dtype.str, list(self.field(name).shape)] for name in self.names}
+
+    def publish(self):
+        # copy the fields wanted by anyone due this step once, then hand
+        # the same copy to all of them
+        self.step += 1
+        with self.lock:
+            subscribers = [s for s in self.subscribers if self.step % s.every == 0]
+        wanted = {name for subscriber in subscribers for name in subscriber.fields}
+        if not wanted:
+            return
+        frame = {name: self.field(name).copy() for name in wanted}
+        for subscriber in subscribers:
+            subscriber.offer(self.step, frame)
+
+    def close(self):
+        try:
+            self.listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.listener.close()
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+
+
+class FrameClient():
+    """
+    Subscribes to a FrameServer. `fields` defaults to all of them; meta
+    and fields (name: [dtype, shape]) come from the server on connect.
+
+        for step, arrays in FrameClient(port, ["density"], stride=2):
+            ...
+    """
+    def __init__(self, port, fields=None, every=1, stride=1, host="127.0.0.1"):
+        self.connection = socket.create_connection((host, port))
+        request = {"fields": list(fields or []), "every": every, "stride": stride}
+        self.connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        hello, _ = receiveMessage(self.connection)
+        if "error" in hello:
+            self.connection.close()
+            raise ValueError(hello["error"])
+        self.meta = hello["meta"]
+        self.fields = hello["fields"]
+        self.dropped = 0
+
+    def receive(self):
+        header, arrays = receiveMessage(self.connection)
+        self.connection.sendall(b"+")
+        self.dropped = header["dropped"]
+        return header["step"], arrays
+
+    def __iter__(self):
+        try:
+            while True:
+                yield self.receive()
+        except ConnectionError:
+            return
+
+    def close(self):
+        self.connection.close()
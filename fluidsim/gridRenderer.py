@@ -0,0 +1,97 @@
+import colorsys
+import math
+
+import numpy as np
+
+def somethingToColor(x):
+    x = max(-60, min(60, x))
+    r = int((1 - 2**(-x/1000))*255)
+    return r,r,r
+
+def velocityToColor(vx_val, vy_val):
+    """
+    Convert velocity vector to RGB color based on direction (HSV hue) and magnitude.
+    """
+    angle = math.atan2(vy_val, vx_val)  # range: [-pi, pi]
+    hue = (angle + math.pi) / (2 * math.pi)  # map to [0, 1]
+    mag = math.sqrt(vx_val**2 + vy_val**2)
+    brightness = min(1.0, mag * 2.0)  # adjust scaling if needed
+    r, g, b = colorsys.hsv_to_rgb(hue, 1.0, brightness)
+    return int(r * 255), int(g * 255), int(b * 255)
+
+class GridRenderer():
+    """
+    Draws a whole grid field in a few array operations.
+
+    Values are quantized to indices into a colour table built once in
+    __init__ from the per-value colour functions above, the resulting
+    one-pixel-per-cell image is written into a small surface with
+    surfarray and scaled to the window in one blit. The quantization keeps
+    density within one grey level of somethingToColor and velocity within
+    10/255 per channel of velocityToColor.
+
+    Fields are indexed [row, column], row 0 at the top of the window.
+    mode is one of
+        "density"     greyscale, somethingToColor
+        "velocity"    hue from direction and brightness from speed,
+                      velocityToColor; draw() takes (vx, vy)
+        "divergence"  blue for sinks, red for sources, white for zero
+    maxValue is the divergence magnitude at full colour, or the largest
+    absolute divergence of each frame when None.
+    """
+    modes = ("density", "velocity", "divergence")
+    # quantization of the velocity table: hue bins by brightness bins
+    hues = 256
+    levels = 64
+
+    def __init__(self, mode="density", maxValue=None):
+        if mode not in self.modes:
+            raise ValueError("mode must be one of %s, not %r" % (", ".join(self.modes), mode))
+        self.mode = mode
+        self.maxValue = maxValue
+        self.small = None
+
+        if mode == "density":
+            # index i stands for density -60 + 120 * i / 255
+            table = [somethingToColor(x) for x in np.linspace(-60, 60, 256)]
+            self.table = np.clip(table, 0, 255).astype(np.uint8)
+        elif mode == "velocity":
+            # bin (h, v) is a velocity with direction angle 2 pi h / hues - pi
+            # and the speed that gives brightness v / (levels - 1)
+            table = []
+            for h in range(self.hues):
+                angle = 2 * math.pi * h / self.hues - math.pi
+                speeds = np.arange(self.levels) / ((self.levels - 1) * 2.0)
+                table.append([velocityToColor(s * math.cos(angle), s * math.sin(angle)) for s in speeds])
+            self.table = np.array(table, dtype=np.uint8)
+        else:
+            t = np.linspace(-1, 1, 256)[:, None]
+            white = np.array([255, 255, 255])
+            red = np.array([220, 30, 30])
+            blue = np.array([30, 60, 220])
+            self.table = np.where(t < 0, white + (blue - white) * -t, white + (red - white) * t).astype(np.uint8)
+
+    def colours(self, field, other=None):
+        # (columns, rows, 3) image for surfarray
+        if self.mode == "density":
+            index = ((np.clip(field, -60, 60) + 60) * (255 / 120)).astype(np.uint8)
+            image = self.table[index]
+        elif self.mode == "velocity":
+            vx, vy = field, other
+            hue = ((np.arctan2(vy, vx) + np.pi) * (self.hues / (2 * np.pi))).astype(int) % self.hues
+            level = (np.minimum(np.hypot(vx, vy) * 2.0, 1.0) * (self.levels - 1)).astype(int)
+            image = self.table[hue, level]
+        else:
+            top = self.maxValue or max(float(np.abs(field).max()), 1e-9)
+            index = ((np.clip(field / top, -1, 1) + 1) * 127.5).astype(np.uint8)
+            image = self.table[index]
+        return image.transpose(1, 0, 2)
+
+    def draw(self, surface, field, other=None):
+        # pygame is only needed here; colours() works without a display
+        import pygame
+        image = self.colours(field, other)
+        if self.small is None or self.small.get_size() != image.shape[:2]:
+            self.small = pygame.Surface(image.shape[:2], 0, surface)
+        pygame.surfarray.blit_array(self.small, image)
+        pygame.transform.scale(self.small, surface.get_size(), surface)
@@ -0,0 +1,177 @@
+"""
+Obstacles that can be added, moved and removed between steps.
+
+An ObstacleSet keeps a reference count of the shapes covering each cell,
+so a change only touches the cells in the old and new footprints. The
+solvers read the cells whose solid state or wall velocity changed with
+takeChanges() and update their face masks around those cells only.
+
+Cells are indexed [y, x] on a (height, width) grid; a shape covers the
+cells whose centres (x + 0.5, y + 0.5) lie inside it.
+"""
+import numpy as np
+
+# how far outside the surface pushed-out particles are placed, in cells
+surfaceGap = 1e-3
+
+class Box():
+    def __init__(self, x0, y0, x1, y1):
+        self.x0, self.y0 = min(x0, x1), min(y0, y1)
+        self.x1, self.y1 = max(x0, x1), max(y0, y1)
+
+    def bounds(self):
+        return self.x0, self.y0, self.x1, self.y1
+
+    def contains(self, x, y):
+        return (x > self.x0) & (x < self.x1) & (y > self.y0) & (y < self.y1)
+
+    def pushOut(self, x, y):
+        # move points inside to the nearest edge
+        distances = np.stack((x - self.x0, self.x1 - x, y - self.y0, self.y1 - y))
+        edge = distances.argmin(axis=0)
+        x = np.where(edge == 0, self.x0 - surfaceGap, np.where(edge == 1, self.x1 + surfaceGap, x))
+        y = np.where(edge == 2, self.y0 - surfaceGap, np.where(edge == 3, self.y1 + surfaceGap, y))
+        return x, y
+
+class Circle():
+    def __init__(self, x, y, radius):
+        self.x = x
+        self.y = y
+        self.radius = radius
+
+    def bounds(self):
+        return self.x - self.radius, self.y - self.radius, self.x + self.radius, self.y + self.radius
+
+    def contains(self, x, y):
+        return (x - self.x) ** 2 + (y - self.y) ** 2 < self.radius * self.radius
+
+    def pushOut(self, x, y):
+        dx = x - self.x
+        dy = y - self.y
+        d = np.hypot(dx, dy)
+        # a point at the exact centre leaves upwards
+        radius = self.radius + surfaceGap
+        scale = np.divide(radius, d, out=np.zeros_like(d), where=d > 0)
+        return self.x + dx * scale, np.where(d > 0, self.y + dy * scale, self.y - radius)
+
+# by class name, for saving shapes as {"type": name, "params": vars(shape)}
+shapeTypes = {"Box": Box, "Circle": Circle}
+
+def footprint(shape, width, height):
+    # flat indices x + y * width of the covered cells, searched only over the
+    # shape's bounding box
+    x0, y0, x1, y1 = shape.bounds()
+    xs = np.arange(max(int(np.floor(x0)), 0), min(int(np.ceil(x1)) + 1, width))
+    ys = np.arange(max(int(np.floor(y0)), 0), min(int(np.ceil(y1)) + 1, height))
+    x, y = np.meshgrid(xs, ys)
+    inside = shape.contains(x + 0.5, y + 0.5)
+    return x[inside] + y[inside] * width
+
+
+class ObstacleSet():
+    """
+    Shapes on top of the static solids `base` (a (height, width) bool
+    array). solid, velocityX and velocityY are the combined per-cell state;
+    a cell covered by several moving shapes takes the velocity of the last
+    one added or moved.
+    """
+    def __init__(self, width, height, base):
+        self.width = width
+        self.height = height
+        self.base = np.asarray(base, dtype=bool).reshape(-1).copy()
+        self.count = np.zeros(width * height, dtype=np.int32)
+        self.solid = self.base.copy()
+        self.velocityX = np.zeros(width * height)
+        self.velocityY = np.zeros(width * height)
+        self.shapes = {}
+        self.nextId = 0
+        self.changes = []
+
+    def add(self, shape, velocity=(0, 0)):
+        obstacleId = self.nextId
+        self.nextId += 1
+        self.place(obstacleId, shape, velocity)
+        return obstacleId
+
+    def move(self, obstacleId, shape, velocity=None):
+        _, _, oldVelocity = self.shapes[obstacleId]
+        self.lift(obstacleId)
+        self.place(obstacleId, shape, oldVelocity if velocity is None else velocity)
+
+    def remove(self, obstacleId):
+        self.lift(obstacleId)
+
+    def place(self, obstacleId, shape, velocity):
+        cells = footprint(shape, self.width, self.height)
+        self.shapes[obstacleId] = (shape, cells, tuple(velocity))
+        self.count[cells] += 1
+        self.solid[cells] = True
+        self.velocityX[cells] = velocity[0]
+        self.velocityY[cells] = velocity[1]
+        self.changes.append(cells)
+
+    def lift(self, obstacleId):
+        _, cells, _ = self.shapes.pop(obstacleId)
+        self.count[cells] -= 1
+        free = cells[self.count[cells] == 0]
+        self.solid[free] = self.base[free]
+        self.velocityX[free] = 0
+        self.velocityY[free] = 0
+        self.changes.append(cells)
+
+    def takeChanges(self):
+        # cells whose solid flag or wall velocity may have changed since the
+        # last call
+        if not self.changes:
+            return np.zeros(0, dtype=int)
+        cells = np.unique(np.concatenate(self.changes))
+        self.changes = []
+        return cells
+
+    def xFaces(self, cells):
+        # faces between horizontal neighbours on a (height, width + 1) face
+        # grid around `cells`: flat face index, open flag and wall velocity
+        width = self.width
+        y, x = np.divmod(cells, width)
+        fx = np.concatenate((x, x + 1))
+        fy = np.concatenate((y, y))
+        faces = np.unique(fx + fy * (width + 1))
+        fy, fx = np.divmod(faces, width + 1)
+        return (faces,) + self.faceState(fy * width + fx - 1, fx > 0, fy * width + fx, fx < width, self.velocityX)
+
+    def yFaces(self, cells):
+        # the same for faces between vertical neighbours, (height + 1, width)
+        width = self.width
+        faces = np.unique(np.concatenate((cells, cells + width)))
+        fy, fx = np.divmod(faces, width)
+        return (faces,) + self.faceState(faces - width, fy > 0, faces, fy < self.height, self.velocityY)
+
+    def faceState(self, low, hasLow, high, hasHigh, velocity):
+        low = np.where(hasLow, low, 0)
+        high = np.where(hasHigh, high, 0)
+        lowSolid = hasLow & self.solid[low]
+        highSolid = hasHigh & self.solid[high]
+        isOpen = ~(lowSolid | highSolid)
+        wall = np.where(lowSolid, velocity[low], np.where(highSolid, velocity[high], 0.0))
+        return isOpen, wall
+
+    def describe(self):
+        # the shapes as JSON-friendly dicts, in the order they were placed
+        return [{"id": obstacleId, "type": type(shape).__name__, "params": vars(shape), "velocity": list(velocity)}
+                for obstacleId, (shape, _, velocity) in self.shapes.items()]
+
+    def restore(self, shapes, nextId):
+        # place shapes saved by describe() under their old ids
+        for spec in shapes:
+            self.place(spec["id"], shapeTypes[spec["type"]](**spec["params"]), spec["velocity"])
+        self.nextId = nextId
+
+    def pushOut(self, x, y, u, v):
+        # particles inside a shape go to its surface and take its velocity
+        for shape, _, velocity in self.shapes.values():
+            inside = np.flatnonzero(shape.contains(x, y))
+            if len(inside) == 0:
+                continue
+            x[inside], y[inside] = shape.pushOut(x[inside], y[inside])
+            u[inside] = velocity[0]
+            v[inside] = velocity[1]
@@ -0,0 +1,310 @@
+"""
+Multi-process execution for large grids.
+
+The grid is cut into horizontal strips, one per worker process. All fields
+live in shared memory, so workers read their neighbours' boundary rows
+directly; the barrier between the red and the black half-sweep is what
+makes those halo rows current. Cells of one colour never share a face, so
+no two workers ever write the same value.
+"""
+import multiprocessing
+import multiprocessing.connection
+import threading
+import traceback
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+class SharedArrays():
+    # named NumPy arrays backed by shared memory blocks
+    def __init__(self, specs, create):
+        self.blocks = {}
+        self.arrays = {}
+        for name, (shape, dtype, blockName) in specs.items():
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            if create:
+                block = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                block = shared_memory.SharedMemory(name=blockName)
+            self.blocks[name] = block
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            if create:
+                self.arrays[name].fill(0)
+
+    def specs(self):
+        return {name: (a.shape, a.dtype.str, self.blocks[name].name) for name, a in self.arrays.items()}
+
+    def close(self, unlink=False):
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+        self.blocks = {}
+
+
+def relax(arrays, r0, r1, iterations, measure, barrier):
+    # red-black Gauss-Seidel on rows r0..r1 of the padded pressure grid.
+    # measure "after" returns the largest residual once done, "before" the
+    # largest residual each colour had just before its first half-sweep
+    p = arrays["pressure"]
+    centre = p[r0+1:r1+1, 1:-1]
+    east, west = p[r0+1:r1+1, 2:], p[r0+1:r1+1, :-2]
+    south, north = p[r0+2:r1+2, 1:-1], p[r0:r1, 1:-1]
+    rhs = arrays["rhs"][r0:r1]
+    invDiag = arrays["invDiag"][r0:r1]
+    cE, cW = arrays["east"][r0:r1], arrays["west"][r0:r1]
+    cS, cN = arrays["south"][r0:r1], arrays["north"][r0:r1]
+    colours = (arrays["red"][r0:r1].astype(bool), arrays["black"][r0:r1].astype(bool))
+    inSystem = invDiag > 0
+    diag = np.divide(1, invDiag, out=np.zeros_like(invDiag), where=inSystem)
+
+    norm = 0.0
+    for i in range(iterations):
+        for colour in colours:
+            updated = (rhs + cE * east + cW * west + cS * south + cN * north) * invDiag
+            if measure == "before" and i == 0 and colour.any():
+                norm = max(norm, float(np.abs((updated - centre)[colour] * diag[colour]).max()))
+            np.copyto(centre, updated, where=colour)
+            barrier.wait()
+
+    if measure != "after" or not inSystem.any():
+        return norm
+    residual = rhs - (diag * centre - cE * east - cW * west - cS * south - cN * north)
+    return float(np.abs(residual[inSystem]).max())
+
+def advect(arrays, r0, r1, timeStep):
+    # the semi-Lagrangian step of StaggeredGrid.handleAdvection for rows r0..r1
+    source = arrays["source"]
+    rows, cols = source.shape
+    X = np.arange(cols)[None, :]
+    Y = np.arange(r0, r1)[:, None]
+    oldX = np.clip(X - arrays["velocityU"][r0:r1] * timeStep, 0, cols - 1.001)
+    oldY = np.clip(Y - arrays["velocityV"][r0:r1] * timeStep, 0, rows - 1.001)
+
+    left = oldX.astype(int)
+    bottom = oldY.astype(int)
+    offsetX = oldX - left
+    offsetY = oldY - bottom
+
+    arrays["advected"][r0:r1] = ((1-offsetX) * (1-offsetY) * source[bottom, left] +
+                                 offsetX * (1-offsetY) *     source[bottom, left + 1] +
+                                 (1-offsetX) * offsetY *     source[bottom + 1, left] +
+                                 offsetX * offsetY *         source[bottom + 1, left + 1])
+
+def workerMain(specs, r0, r1, barrier, connection):
+    # replies ("ok", result) or ("error", traceback); a failing worker
+    # breaks the barrier so the others stop waiting for it
+    shared = SharedArrays(specs, create=False)
+    arrays = shared.arrays
+    try:
+        while True:
+            command, args = connection.recv()
+            if command not in ("relax", "advect"):
+                break
+            try:
+                if command == "relax":
+                    result = relax(arrays, r0, r1, *args, barrier)
+                else:
+                    result = advect(arrays, r0, r1, args)
+                connection.send(("ok", result))
+            except Exception as e:
+                barrier.abort()
+                connection.send(("error", (isinstance(e, threading.BrokenBarrierError), traceback.format_exc())))
+    finally:
+        shared.close()
+
+
+def shutdown(connections, processes, shared):
+    for connection in connections:
+        try:
+            connection.send(("stop", None))
+        except OSError:
+            pass
+    for process in processes:
+        process.join()
+    shared.close(unlink=True)
+
+
+class TilePool():
+    """
+    Persistent worker processes, each owning a strip of rows of a
+    (height, width) grid, plus the shared arrays they work on. An error
+    in any worker, or a worker exiting, is raised from broadcast() as a
+    RuntimeError.
+    """
+    # seconds a worker waits at the barrier before giving up
+    barrierTimeout = 60
+    def __init__(self, height, width, workers=None):
+        workers = min(workers or multiprocessing.cpu_count(), height)
+        self.height = height
+        self.width = width
+        self.workers = workers
+
+        grid = ((height, width), np.float64, None)
+        self.shared = SharedArrays({
+            "pressure": ((height + 2, width + 2), np.float64, None),
+            "rhs": grid, "invDiag": grid,
+            "east": grid, "west": grid, "south": grid, "north": grid,
+            "red": ((height, width), np.uint8, None), "black": ((height, width), np.uint8, None),
+            "source": grid, "velocityU": grid, "velocityV": grid, "advected": grid,
+        }, create=True)
+        self.arrays = self.shared.arrays
+
+        bounds = np.linspace(0, height, workers + 1).astype(int)
+        # kept on the pool: under spawn the workers attach to it after start()
+        # the timeout also frees the others if a worker dies outright
+        self.barrier = barrier = multiprocessing.Barrier(workers, timeout=self.barrierTimeout)
+        self.connections = []
+        self.processes = []
+        for r0, r1 in zip(bounds[:-1], bounds[1:]):
+            parentEnd, childEnd = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=workerMain, args=(self.shared.specs(), r0, r1, barrier, childEnd), daemon=True)
+            process.start()
+            self.connections.append(parentEnd)
+            self.processes.append(process)
+        # also runs if the pool is dropped without close(), or at exit
+        self.finalizer = weakref.finalize(self, shutdown, self.connections, self.processes, self.shared)
+
+    def exited(self, index):
+        # the reply of a worker whose pipe is closed; the others are freed
+        # from the barrier at once rather than after barrierTimeout
+        self.barrier.abort()
+        return ("error", (False, "worker %d exited (exit code %s)" % (index, self.processes[index].exitcode)))
+
+    def broadcast(self, command, args=None):
+        # every reply is read, even after a failure, so none is left in a
+        # pipe to be taken as the answer to a later command
+        replies = [None] * self.workers
+        pending = {}
+        for index, connection in enumerate(self.connections):
+            try:
+                connection.send((command, args))
+                pending[connection] = index
+            except OSError:
+                replies[index] = self.exited(index)
+        while pending:
+            for connection in multiprocessing.connection.wait(list(pending)):
+                index = pending.pop(connection)
+                try:
+                    replies[index] = connection.recv()
+                except (EOFError, OSError):
+                    replies[index] = self.exited(index)
+        errors = [reply for status, reply in replies if status == "error"]
+        if errors:
+            # report the worker that failed first, not the ones it unblocked
+            self.barrier.reset()
+            _, message = min(errors, key=lambda error: error[0])
+            raise RuntimeError("%s failed in a worker:\n%s" % (command, message))
+        return [reply for _, reply in replies]
+
+    def close(self):
+        self.finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def advect(self, field, velocityU, velocityV, timeStep):
+        # same result as StaggeredGrid.handleAdvection, written back into field
+        self.arrays["source"][:] = field
+        self.arrays["velocityU"][:] = velocityU
+        self.arrays["velocityV"][:] = velocityV
+        self.broadcast("advect", timeStep)
+        field[:] = self.arrays["advected"]
+
+
+class ParallelRedBlackSolver():
+    """
+    Red-black Gauss-Seidel pressure solver spread over a TilePool. Takes the
+    same PressureSystem as the serial solvers and gives the same iterates
+    as GaussSeidelSolver.
+
+    With sweepNorm the stopping test is StaggeredGrid.handleDivergence's
+    instead: at the first iteration of every checkInterval, the largest
+    residual each colour had just before its half-sweep, stopping after
+    that iteration once it is below tolerance. diagnostics, if given, is
+    called as diagnostics(iteration, norm) at each of those checks.
+    """
+    name = "parallelRedBlack"
+
+    def __init__(self, workers=None, tolerance=1e-3, checkInterval=10, sweepNorm=False, diagnostics=None):
+        self.workers = workers
+        self.tolerance = tolerance
+        self.checkInterval = checkInterval
+        self.sweepNorm = sweepNorm
+        self.diagnostics = diagnostics
+        self.pool = None
+        self.system = None
+
+    def poolFor(self, system):
+        if self.pool is None or (self.pool.height, self.pool.width) != (system.height, system.width):
+            if self.pool is not None:
+                self.pool.close()
+            self.pool = TilePool(system.height, system.width, self.workers)
+            self.system = None
+        return self.pool
+
+    def load(self, system):
+        # scatter the compact system onto the pool's full grids; skipped when
+        # the same system is solved again
+        if system is self.system:
+            return
+        arrays = self.pool.arrays
+        y, x = np.divmod(system.cells, system.width)
+        for name in ("invDiag", "east", "west", "south", "north", "red", "black"):
+            arrays[name].fill(0)
+        arrays["invDiag"][y, x] = 1 / system.diag
+        for name, coupling in zip(("east", "west", "south", "north"), system.coupling):
+            arrays[name][y, x] = coupling
+        arrays["red"][y[system.colours[0]], x[system.colours[0]]] = 1
+        arrays["black"][y[system.colours[1]], x[system.colours[1]]] = 1
+        self.system = system
+
+    def solve(self, system, rhs, maxIterations, initialGuess=None):
+        rhs = system.compatible(rhs)
+        pool = self.poolFor(system)
+        self.load(system)
+
+        y, x = np.divmod(system.cells, system.width)
+        pool.arrays["rhs"].fill(0)
+        pool.arrays["rhs"][y, x] = rhs
+        pool.arrays["pressure"].fill(0)
+        if initialGuess is not None:
+            pool.arrays["pressure"][y + 1, x + 1] = initialGuess
+
+        if self.sweepNorm:
+            iterations, residual = self.relaxSweeps(pool, maxIterations)
+        else:
+            residual = system.residual(system.padded(initialGuess), rhs)
+            iterations = 0
+            while iterations < maxIterations and residual > self.tolerance:
+                chunk = min(self.checkInterval, maxIterations - iterations)
+                residual = max(pool.broadcast("relax", (chunk, "after")))
+                iterations += chunk
+        return pool.arrays["pressure"][y + 1, x + 1].copy(), iterations, residual
+
+    def relaxSweeps(self, pool, maxIterations):
+        # one measured iteration, then the unmeasured rest of the interval
+        iterations = 0
+        norm = 0.0
+        while iterations < maxIterations:
+            norm = max(pool.broadcast("relax", (1, "before")))
+            if self.diagnostics is not None:
+                self.diagnostics(iterations, norm)
+            iterations += 1
+            if norm < self.tolerance:
+                break
+            chunk = min(self.checkInterval - 1, maxIterations - iterations)
+            if chunk > 0:
+                pool.broadcast("relax", (chunk, None))
+                iterations += chunk
+        return iterations, norm
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
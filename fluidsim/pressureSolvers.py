@@ -0,0 +1,253 @@
+import numpy as np
+from .parallelGrid import ParallelRedBlackSolver
+
+class PressureSystem():
+    """
+    Pressure Poisson system for a set of cells on a staggered MAC grid.
+
+    Solvers implement solve(system, rhs, maxIterations, initialGuess=None)
+    and return (p, iterations, residual); initialGuess is a previous p for
+    the same cells, used to warm-start the iteration.
+
+    Cells are flat indices x + y * width. u faces are laid out as
+    (height, width+1) and v faces as (height+1, width), matching
+    Fluid.xy(). Cells outside the set act as p = 0 and faces with
+    notSolidU/notSolidV == 0 are closed.
+
+    setBlocks() splits the unknowns into uncoupled sub-systems; solvers
+    with a solveBlocks() then test convergence and stop each one on its
+    own, so a block's result does not depend on the others.
+    """
+    def __init__(self, width, height, cells, notSolidU, notSolidV):
+        cells = np.asarray(cells)
+        y = cells // width
+        x = cells - y * width
+        uRight = cells + y + 1
+        uLeft = cells + y
+        vDown = cells + width
+        vUp = cells
+
+        faceOpen = np.stack((notSolidU[uRight], notSolidU[uLeft], notSolidV[vDown], notSolidV[vUp])).astype(float)
+        diag = faceOpen.sum(axis=0)
+        keep = diag > 0
+
+        self.width = width
+        self.height = height
+        self.cells = cells[keep]
+        self.n = len(self.cells)
+        self.uRight = uRight[keep]
+        self.uLeft = uLeft[keep]
+        self.vDown = vDown[keep]
+        self.vUp = vUp[keep]
+        self.faceOpen = faceOpen[:, keep]
+        self.diag = diag[keep]
+        x = x[keep]
+        y = y[keep]
+
+        # neighbour positions in the compact vector; n points at a padding
+        # slot that always holds 0 (cells outside the system)
+        lookup = np.full(width * height, self.n)
+        lookup[self.cells] = np.arange(self.n)
+        self.neighbours = np.stack((
+            np.where(x + 1 < width, lookup[np.minimum(self.cells + 1, width * height - 1)], self.n),
+            np.where(x > 0, lookup[self.cells - 1], self.n),
+            np.where(y + 1 < height, lookup[np.minimum(self.cells + width, width * height - 1)], self.n),
+            np.where(y > 0, lookup[self.cells - width], self.n)))
+        self.coupling = self.faceOpen * (self.neighbours < self.n)
+        self.hasDirichlet = bool(np.any(self.coupling.sum(axis=0) < self.diag))
+
+        # red ((x + y) odd) is relaxed first, as in eulerianStaggeredGrid
+        parity = (x + y) % 2
+        self.colours = [np.flatnonzero(parity == 1), np.flatnonzero(parity == 0)]
+        self.blocks = None
+        self.numBlocks = 1
+
+    def setBlocks(self, blocks, numBlocks):
+        # block id of every cell in self.cells; blocks must share no open face
+        self.blocks = np.asarray(blocks)
+        self.numBlocks = numBlocks
+
+    def blockSum(self, values):
+        return np.bincount(self.blocks, values, self.numBlocks)
+
+    def blockMax(self, values):
+        result = np.zeros(self.numBlocks)
+        np.maximum.at(result, self.blocks, values)
+        return result
+
+    def padded(self, p=None):
+        padded = np.zeros(self.n + 1)
+        if p is not None:
+            padded[:self.n] = p
+        return padded
+
+    def compatible(self, rhs):
+        # in a closed container only the zero-mean part of rhs is solvable
+        if self.blocks is not None:
+            dirichlet = self.blockSum(self.coupling.sum(axis=0) < self.diag) > 0
+            mean = self.blockSum(rhs) / np.maximum(np.bincount(self.blocks, minlength=self.numBlocks), 1)
+            return rhs - np.where(dirichlet, 0, mean)[self.blocks]
+        if self.hasDirichlet or self.n == 0:
+            return rhs
+        return rhs - rhs.mean()
+
+    def blockResidual(self, padded, rhs):
+        return self.blockMax(np.abs(rhs - self.multiply(padded)))
+
+    def divergence(self, u, v):
+        return u[self.uRight] - u[self.uLeft] + v[self.vDown] - v[self.vUp]
+
+    def multiply(self, padded):
+        return self.diag * padded[:self.n] - (self.coupling * padded[self.neighbours]).sum(axis=0)
+
+    def residual(self, padded, rhs):
+        if self.n == 0:
+            return 0.0
+        return float(np.abs(rhs - self.multiply(padded)).max())
+
+    def applyPressure(self, u, v, p):
+        u[self.uRight] -= self.faceOpen[0] * p
+        u[self.uLeft] += self.faceOpen[1] * p
+        v[self.vDown] -= self.faceOpen[2] * p
+        v[self.vUp] += self.faceOpen[3] * p
+
+
+class GaussSeidelSolver():
+    """
+    Red-black Gauss-Seidel relaxation, the same sweep water3.Fluid does
+    on velocities, written on the pressure unknowns.
+    """
+    name = "gaussSeidel"
+
+    def __init__(self, tolerance=1e-3, checkInterval=5):
+        self.tolerance = tolerance
+        self.checkInterval = checkInterval
+
+    def solve(self, system, rhs, maxIterations, initialGuess=None):
+        if system.blocks is not None:
+            return self.solveBlocks(system, rhs, maxIterations, initialGuess)
+        rhs = system.compatible(rhs)
+        p = system.padded(initialGuess)
+        residual = system.residual(p, rhs)
+        iterations = 0
+        while iterations < maxIterations and residual > self.tolerance:
+            iterations += 1
+            for colour in system.colours:
+                neighbours = system.neighbours[:, colour]
+                p[colour] = (rhs[colour] + (system.coupling[:, colour] * p[neighbours]).sum(axis=0)) / system.diag[colour]
+            if iterations % self.checkInterval == 0 or iterations == maxIterations:
+                residual = system.residual(p, rhs)
+        return p[:system.n], iterations, residual
+
+    def solveBlocks(self, system, rhs, maxIterations, initialGuess=None):
+        # the same sweeps, leaving blocks alone once they have converged
+        rhs = system.compatible(rhs)
+        p = system.padded(initialGuess)
+        residual = system.blockResidual(p, rhs)
+        active = residual > self.tolerance
+        iterations = 0
+        while iterations < maxIterations and active.any():
+            iterations += 1
+            for colour in system.colours:
+                colour = colour[active[system.blocks[colour]]]
+                neighbours = system.neighbours[:, colour]
+                p[colour] = (rhs[colour] + (system.coupling[:, colour] * p[neighbours]).sum(axis=0)) / system.diag[colour]
+            if iterations % self.checkInterval == 0 or iterations == maxIterations:
+                residual = np.where(active, system.blockResidual(p, rhs), residual)
+                active &= residual > self.tolerance
+        return p[:system.n], iterations, float(residual.max(initial=0.0))
+
+
+class PCGSolver():
+    """
+    Conjugate gradient with a Jacobi (diagonal) preconditioner.
+    """
+    name = "pcg"
+
+    def __init__(self, tolerance=1e-3):
+        self.tolerance = tolerance
+
+    def solve(self, system, rhs, maxIterations, initialGuess=None):
+        if system.blocks is not None:
+            return self.solveBlocks(system, rhs, maxIterations, initialGuess)
+        rhs = system.compatible(rhs)
+        p = system.padded(initialGuess)
+        d = system.padded()
+        r = rhs - system.multiply(p) if initialGuess is not None else rhs.copy()
+        residual = float(np.abs(r).max()) if system.n else 0.0
+        iterations = 0
+        if residual <= self.tolerance:
+            return p[:system.n], iterations, residual
+
+        z = r / system.diag
+        d[:system.n] = z
+        rz = r @ z
+        while iterations < maxIterations:
+            iterations += 1
+            q = system.multiply(d)
+            alpha = rz / (d[:system.n] @ q)
+            p[:system.n] += alpha * d[:system.n]
+            r -= alpha * q
+
+            residual = float(np.abs(r).max())
+            if residual <= self.tolerance:
+                break
+
+            z = r / system.diag
+            rzNew = r @ z
+            d[:system.n] = z + (rzNew / rz) * d[:system.n]
+            rz = rzNew
+        return p[:system.n], iterations, residual
+
+    def solveBlocks(self, system, rhs, maxIterations, initialGuess=None):
+        # one CG per block: dot products, step sizes and the stopping test
+        # are taken block by block, and a converged block's search
+        # direction is zeroed so it no longer changes
+        n, blocks = system.n, system.blocks
+        rhs = system.compatible(rhs)
+        p = system.padded(initialGuess)
+        d = system.padded()
+        r = rhs - system.multiply(p) if initialGuess is not None else rhs.copy()
+        residual = system.blockMax(np.abs(r))
+        active = residual > self.tolerance
+        iterations = 0
+        if not active.any():
+            return p[:n], iterations, float(residual.max(initial=0.0))
+
+        z = r / system.diag
+        d[:n] = z * active[blocks]
+        rz = system.blockSum(r * z)
+        while iterations < maxIterations:
+            iterations += 1
+            q = system.multiply(d)
+            dq = system.blockSum(d[:n] * q)
+            alpha = np.divide(rz, dq, out=np.zeros(system.numBlocks), where=active & (dq != 0))
+            p[:n] += alpha[blocks] * d[:n]
+            r -= alpha[blocks] * q
+
+            residual = np.where(active, system.blockMax(np.abs(r)), residual)
+            active &= residual > self.tolerance
+            if not active.any():
+                break
+
+            z = r / system.diag
+            rzNew = system.blockSum(r * z)
+            beta = np.divide(rzNew, rz, out=np.zeros(system.numBlocks), where=active & (rz != 0))
+            d[:n] = (z + beta[blocks] * d[:n]) * active[blocks]
+            rz = rzNew
+        return p[:n], iterations, float(residual.max())
+
+
+solvers = {
+    GaussSeidelSolver.name: GaussSeidelSolver,
+    PCGSolver.name: PCGSolver,
+    ParallelRedBlackSolver.name: ParallelRedBlackSolver,
+}
+
+def makePressureSolver(solver=None, **options):
+    # accepts a solver instance, a registered name or None for the default
+    if solver is None:
+        solver = PCGSolver.name
+    if isinstance(solver, str):
+        return solvers[solver](**options)
+    return solver
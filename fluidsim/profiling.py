@@ -0,0 +1,85 @@
+import json
+import time
+from collections import deque
+
+def runStage(name, func, *args):
+    # what solvers call in place of StageProfiler.stage when profiling is off
+    return func(*args)
+
+class StageProfiler():
+    """
+    Opt-in per-stage timing for a solver's step.
+
+    Solvers call stage() around each stage and endStep() with their own
+    statistics (solver iterations, divergence, ...). The last `window` steps
+    are kept for summary() and exportTrace().
+    """
+    def __init__(self, window=300):
+        self.steps = deque(maxlen=window)
+        self.stepCount = 0
+        self.origin = time.perf_counter()
+        self.current = None
+
+    def stage(self, name, func, *args):
+        if self.current is None:
+            self.current = {"step": self.stepCount, "start": time.perf_counter(), "stages": []}
+        start = time.perf_counter()
+        result = func(*args)
+        self.current["stages"].append((name, start, time.perf_counter() - start))
+        return result
+
+    def endStep(self, **stats):
+        step = self.current or {"step": self.stepCount, "start": time.perf_counter(), "stages": []}
+        step["duration"] = time.perf_counter() - step["start"]
+        step["stats"] = stats
+        self.steps.append(step)
+        self.stepCount += 1
+        self.current = None
+
+    def summary(self):
+        # mean and max seconds per stage and mean of every statistic over the window
+        stages = {}
+        stats = {}
+        for step in self.steps:
+            for name, _, duration in step["stages"]:
+                stages.setdefault(name, []).append(duration)
+            for name, value in step["stats"].items():
+                stats.setdefault(name, []).append(value)
+
+        return {
+            "steps": len(self.steps),
+            "stepSeconds": sum(s["duration"] for s in self.steps) / max(len(self.steps), 1),
+            "stages": {name: {"mean": sum(d) / len(d), "max": max(d)} for name, d in stages.items()},
+            "stats": {name: sum(v) / len(v) for name, v in stats.items()},
+        }
+
+    def report(self):
+        summary = self.summary()
+        lines = ["%d steps, %.3f ms per step" % (summary["steps"], summary["stepSeconds"] * 1000)]
+        for name, times in summary["stages"].items():
+            lines.append("  %-26s %9.3f ms  (max %.3f)" % (name, times["mean"] * 1000, times["max"] * 1000))
+        for name, value in summary["stats"].items():
+            lines.append("  %-26s %9.4g" % (name, value))
+        return "\n".join(lines)
+
+    def traceEvents(self, pid=0, tid=0):
+        def micros(t):
+            return (t - self.origin) * 1e6
+
+        events = []
+        for step in self.steps:
+            events.append({"name": "step", "ph": "X", "pid": pid, "tid": tid,
+                           "ts": micros(step["start"]), "dur": step["duration"] * 1e6,
+                           "args": dict(step["stats"], step=step["step"])})
+            for name, start, duration in step["stages"]:
+                events.append({"name": name, "ph": "X", "pid": pid, "tid": tid,
+                               "ts": micros(start), "dur": duration * 1e6})
+            for name, value in step["stats"].items():
+                events.append({"name": name, "ph": "C", "pid": pid, "tid": tid,
+                               "ts": micros(step["start"]), "args": {name: value}})
+        return events
+
+    def exportTrace(self, path):
+        # Chrome trace format, open in chrome://tracing or Perfetto
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.traceEvents(), "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,193 @@
+"""
+Chunked, seekable recordings of simulation frames.
+
+Frames are grouped into chunks of up to chunkFrames. The first frame of a
+chunk is its keyframe and is stored exactly; every later frame stores each
+field as int16 steps of the difference from the keyframe, with one scale
+per field and frame. Every blob is zlib-compressed on its own.
+
+Deltas pair values by array position. waterNumpy.Fluid re-sorts its
+particles every sortInterval steps, after which most particles sit at
+another position, so within a chunk the particle fields past a re-sort
+are effectively keyframe plus noise. They are still kept as deltas: an
+int16 delta is a quarter of an exact float64 keyframe and its error is
+bounded by the same per-frame scale.
+
+Layout: a 64 byte preamble (magic, index offset, index length), the blobs,
+then a JSON index with the fields, the caller's metadata and, per frame,
+where its blobs are. Reading frame i maps the file and decodes only that
+frame and its chunk's keyframe.
+
+Recorder hands frames to a writer thread, so quantizing, compressing and
+writing happen off the simulation thread.
+"""
+import json
+import mmap
+import queue
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+magic = b"FLUIDRC1"
+preamble = struct.Struct("<8sQQ")
+steps = 32767
+
+particleFields = ("particleX", "particleY", "particleU", "particleV")
+gridFields = ("u", "v", "density")
+
+def encodeFrame(arrays, key, level):
+    # (blobs, scales) of one frame; key is None for a keyframe
+    blobs = {}
+    scales = {}
+    for name, array in arrays.items():
+        if key is None:
+            blobs[name] = zlib.compress(np.ascontiguousarray(array).tobytes(), level)
+            scales[name] = None
+            continue
+        delta = array.astype(np.float64) - key[name]
+        scale = float(np.abs(delta).max()) / steps if delta.size else 0.0
+        quantized = np.rint(delta / scale) if scale > 0 else np.zeros(delta.shape)
+        blobs[name] = zlib.compress(quantized.astype(np.int16).tobytes(), level)
+        scales[name] = scale
+    return blobs, scales
+
+
+class Recorder():
+    """
+    Records the named attributes of a solver, one frame per record() call.
+
+        recorder = Recorder("run.fsr", fluid, particleFields + gridFields)
+        for _ in range(steps):
+            fluid.sim()
+            recorder.record()
+        recorder.close()
+
+    record() only copies the arrays; at most `queued` frames wait for the
+    writer thread before record() blocks. meta is stored in the index for
+    players (grid size, colour scale, ...).
+    """
+    def __init__(self, path, source, names, chunkFrames=30, level=6, queued=8, meta=None):
+        self.source = source
+        self.names = tuple(names)
+        self.chunkFrames = chunkFrames
+        self.level = level
+        self.meta = dict(meta or {})
+        self.file = open(path, "wb")
+        self.file.write(bytes(64))
+
+        self.frames = []
+        self.chunks = []
+        self.key = None
+        self.keyShapes = None
+        self.error = None
+        self.queue = queue.Queue(queued)
+        self.writer = threading.Thread(target=self.writeFrames, daemon=True)
+        self.writer.start()
+
+    def record(self):
+        if self.error is not None:
+            raise self.error
+        self.queue.put({name: np.array(getattr(self.source, name)) for name in self.names})
+
+    def writeFrames(self):
+        while True:
+            arrays = self.queue.get()
+            if arrays is None:
+                return
+            try:
+                self.writeFrame(arrays)
+            except Exception as e:
+                self.error = e
+
+    def writeFrame(self, arrays):
+        shapes = {name: (array.dtype.str, array.shape) for name, array in arrays.items()}
+        # a new chunk when the current one is full or a field changed size
+        if self.key is None or shapes != self.keyShapes or len(self.chunks[-1]) == self.chunkFrames:
+            blobs, scales = encodeFrame(arrays, None, self.level)
+            self.key = {name: array.astype(np.float64) for name, array in arrays.items()}
+            self.keyShapes = shapes
+            self.chunks.append([])
+        else:
+            blobs, scales = encodeFrame(arrays, self.key, self.level)
+
+        fields = {}
+        for name, blob in blobs.items():
+            fields[name] = [self.file.tell(), len(blob), scales[name]]
+            self.file.write(blob)
+        self.chunks[-1].append(len(self.frames))
+        self.frames.append({"chunk": len(self.chunks) - 1, "fields": fields,
+                            "shapes": {name: [dtype, list(shape)] for name, (dtype, shape) in shapes.items()}})
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
+        index = json.dumps({"version": 1, "fields": self.names, "meta": self.meta,
+                            "chunkFrames": self.chunkFrames, "chunks": self.chunks,
+                            "frames": self.frames}).encode("utf-8")
+        indexOffset = self.file.tell()
+        self.file.write(index)
+        self.file.seek(0)
+        self.file.write(preamble.pack(magic, indexOffset, len(index)))
+        self.file.close()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Recording():
+    """
+    A recording opened for random access. recording[i] is a dict of the
+    arrays of frame i; the decoded keyframe of the last chunk read is kept.
+    """
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        tag, indexOffset, indexLength = preamble.unpack(self.map[:preamble.size])
+        if tag != magic:
+            raise ValueError("%s is not a fluid recording" % path)
+        index = json.loads(self.map[indexOffset:indexOffset + indexLength])
+        self.fields = tuple(index["fields"])
+        self.meta = index["meta"]
+        self.chunks = index["chunks"]
+        self.frames = index["frames"]
+        self.keyChunk = None
+        self.key = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def blob(self, entry):
+        offset, length, _ = entry
+        return zlib.decompress(self.map[offset:offset + length])
+
+    def keyframe(self, chunk):
+        if chunk != self.keyChunk:
+            frame = self.frames[self.chunks[chunk][0]]
+            self.key = {name: np.frombuffer(self.blob(entry), dtype=frame["shapes"][name][0]).reshape(frame["shapes"][name][1])
+                        for name, entry in frame["fields"].items()}
+            self.keyChunk = chunk
+        return self.key
+
+    def __getitem__(self, i):
+        i = range(len(self))[i]
+        frame = self.frames[i]
+        key = self.keyframe(frame["chunk"])
+        if self.chunks[frame["chunk"]][0] == i:
+            return {name: array.copy() for name, array in key.items()}
+        arrays = {}
+        for name, entry in frame["fields"].items():
+            dtype, shape = frame["shapes"][name]
+            quantized = np.frombuffer(self.blob(entry), dtype=np.int16).reshape(shape)
+            arrays[name] = (key[name] + quantized * entry[2]).astype(dtype)
+        return arrays
+
+    def close(self):
+        self.map.close()
+        self.file.close()
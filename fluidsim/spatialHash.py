@@ -0,0 +1,62 @@
+import numpy as np
+
+class CellIndex():
+    """
+    Counting-sort spatial hash over the fluid cell grid.
+
+    After build(), the particles of cell c are order[cellStart[c]:cellStart[c+1]]
+    and particleCell holds each particle's flat cell index x + y * width.
+    """
+    # forward half of the 3x3 neighbourhood, so every pair is found once
+    neighbourOffsets = ((1, 0), (-1, 1), (0, 1), (1, 1))
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.numCells = width * height
+        self.cellStart = np.zeros(self.numCells + 1, dtype=int)
+        self.order = np.zeros(0, dtype=int)
+        self.particleCell = np.zeros(0, dtype=int)
+
+    def build(self, x, y):
+        ix = np.clip(x.astype(int), 0, self.width - 1)
+        iy = np.clip(y.astype(int), 0, self.height - 1)
+        self.particleCell = ix + iy * self.width
+
+        counts = np.bincount(self.particleCell, minlength=self.numCells)
+        np.cumsum(counts, out=self.cellStart[1:])
+        # stable sort of small integer keys; nearly linear once the particle
+        # arrays themselves are kept in cell order
+        self.order = np.argsort(self.particleCell, kind="stable")
+
+    def counts(self):
+        return np.diff(self.cellStart)
+
+    def neighbourPairs(self):
+        # every particle pair sharing a cell or touching cells, as two index
+        # arrays (i, j) with no pair repeated
+        sortedCell = self.particleCell[self.order]
+        position = np.arange(len(self.order))
+        cx = sortedCell % self.width
+        cy = sortedCell // self.width
+
+        owners = [position]
+        starts = [position + 1]
+        ends = [self.cellStart[sortedCell + 1]]
+        for dx, dy in self.neighbourOffsets:
+            nx = cx + dx
+            ny = cy + dy
+            inside = (nx >= 0) & (nx < self.width) & (ny < self.height)
+            cell = nx[inside] + ny[inside] * self.width
+            owners.append(position[inside])
+            starts.append(self.cellStart[cell])
+            ends.append(self.cellStart[cell + 1])
+
+        owner = np.concatenate(owners)
+        start = np.concatenate(starts)
+        lengths = np.concatenate(ends) - start
+
+        total = lengths.sum()
+        offsets = np.cumsum(lengths) - lengths
+        partner = np.arange(total) - np.repeat(offsets - start, lengths)
+        return self.order[np.repeat(owner, lengths)], self.order[partner]
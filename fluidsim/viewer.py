@@ -0,0 +1,164 @@
+"""
+Run a solver and its pygame window at their own rates.
+
+The solver steps in a worker thread and, after every step, copies the
+fields the window needs into a TripleBuffer. The pygame loop draws the
+newest complete frame whenever it is ready to, so a slow step no longer
+freezes the window and a slow draw no longer holds back the solver.
+NumPy and pygame release the GIL for their heavy work, which is what
+lets the two threads overlap.
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+class Frame():
+    # copies of a solver's arrays (and plain attributes) at one step
+    def __init__(self):
+        self.step = -1
+
+    def capture(self, source, names, step):
+        for name in names:
+            value = getattr(source, name)
+            if isinstance(value, np.ndarray):
+                current = getattr(self, name, None)
+                if current is None or current.shape != value.shape or current.dtype != value.dtype:
+                    current = np.empty_like(value)
+                    setattr(self, name, current)
+                np.copyto(current, value)
+            else:
+                setattr(self, name, value)
+        self.step = step
+
+
+class TripleBuffer():
+    """
+    Three frames: the writer fills `back`, then swaps it with `ready`; the
+    reader swaps `ready` into `front` when a newer frame is there. Only the
+    index swap is locked, so neither side ever waits for the other's copy.
+    """
+    def __init__(self):
+        self.front = Frame()
+        self.ready = Frame()
+        self.back = Frame()
+        self.fresh = False
+        self.lock = threading.Lock()
+
+    def publish(self, source, names, step):
+        self.back.capture(source, names, step)
+        with self.lock:
+            self.back, self.ready = self.ready, self.back
+            self.fresh = True
+
+    def latest(self):
+        with self.lock:
+            if self.fresh:
+                self.front, self.ready = self.ready, self.front
+                self.fresh = False
+        return self.front
+
+
+class RateCounter():
+    # events per second over the last `window` seconds
+    def __init__(self, window=1.0):
+        self.window = window
+        self.times = deque()
+        self.count = 0
+
+    def tick(self):
+        now = time.perf_counter()
+        self.times.append(now)
+        self.count += 1
+        while self.times and now - self.times[0] > self.window:
+            self.times.popleft()
+
+    def rate(self):
+        if len(self.times) < 2:
+            return 0.0
+        return (len(self.times) - 1) / max(self.times[-1] - self.times[0], 1e-9)
+
+
+class SimulationWorker(threading.Thread):
+    """
+    Calls step() until stopped and publishes `names` of `source` after each
+    step. maxRate, if given, caps the steps per second.
+    """
+    def __init__(self, step, source, names, buffer, maxRate=None):
+        super().__init__(daemon=True)
+        self.stepFunction = step
+        self.source = source
+        self.names = names
+        self.buffer = buffer
+        self.maxRate = maxRate
+        self.rate = RateCounter()
+        self.stopping = threading.Event()
+        self.error = None
+
+    def run(self):
+        step = 0
+        try:
+            while not self.stopping.is_set():
+                start = time.perf_counter()
+                self.stepFunction()
+                step += 1
+                self.buffer.publish(self.source, self.names, step)
+                self.rate.tick()
+                if self.maxRate:
+                    self.stopping.wait(max(1 / self.maxRate - (time.perf_counter() - start), 0))
+        except Exception as e:
+            self.error = e
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+def runViewer(step, source, names, draw, size, caption="", fps=60, maxSteps=None, maxSeconds=None):
+    """
+    Open a window of `size` and run `step` in a SimulationWorker. draw(screen,
+    frame) is called with the newest Frame at up to `fps` frames per second.
+    Runs until the window is closed, or for maxSteps solver steps or
+    maxSeconds seconds. Returns the final simulation and render rates.
+    """
+    import pygame
+
+    pygame.init()
+    screen = pygame.display.set_mode(size)
+    clock = pygame.time.Clock()
+
+    buffer = TripleBuffer()
+    buffer.publish(source, names, 0)
+    worker = SimulationWorker(step, source, names, buffer)
+    renderRate = RateCounter()
+    start = time.perf_counter()
+    worker.start()
+
+    running = True
+    try:
+        while running and worker.is_alive():
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+
+            frame = buffer.latest()
+            draw(screen, frame)
+            pygame.display.flip()
+            renderRate.tick()
+
+            if renderRate.count % 30 == 0:
+                pygame.display.set_caption("%s  sim %.1f steps/s  render %.1f fps" % (caption, worker.rate.rate(), renderRate.rate()))
+            if maxSteps is not None and worker.rate.count >= maxSteps:
+                running = False
+            if maxSeconds is not None and time.perf_counter() - start > maxSeconds:
+                running = False
+            clock.tick(fps)
+    finally:
+        worker.stop()
+        pygame.quit()
+
+    return {"simulationRate": worker.rate.rate(), "renderRate": renderRate.rate(),
+            "steps": worker.rate.count, "frames": renderRate.count}
@@ -26,6 +26,7 @@ class Fluid():
         self.isWater = [False] * self.numCells
         self.isWaterU = [0] * self.numCellsU
         self.isWaterV = [0] * self.numCellsV
+        self.waterCells = []
 
         self.particleX = [random.uniform(3, int(width/3*2)-4) for _ in range(numParticles)]
         self.particleY = [random.uniform(3, height-4) for _ in range(numParticles)]
@@ -101,6 +102,7 @@ class Fluid():
         isWater = [False] * self.numCells
         isWaterU = [0] * self.numCellsU
         isWaterV = [0] * self.numCellsV
+        waterCells = []
 
         for p in range(self.numParticles):
             ix = int(self.particleX[p])
@@ -115,7 +117,11 @@ class Fluid():
                 isWaterU[locU+1    ] = 1
                 isWaterV[locV      ] = 1
                 isWaterV[locV+width] = 1
+                if self.notSolid[locV]:
+                    waterCells.append(locV)
         
+        waterCells.sort()
+        self.waterCells = waterCells
         self.isWater = isWater
         self.isWaterU = isWaterU
         self.isWaterV = isWaterV
@@ -209,47 +215,46 @@ class Fluid():
 
     def calculateTotalDivergence(self):
         totalDivergence = 0
-        numWater = 0
-        for x in range(self.width):
-            for y in range(self.height):
-                if (self.notSolid[self.xy(x, y)]):
-                    numWater += 1
-                    totalDivergence += abs(self.u[self.xy(x+1, y  , 1)] - 
-                                           self.u[self.xy(x  , y  , 1)] + 
-                                           self.v[self.xy(x  , y+1   )] - 
-                                           self.v[self.xy(x  , y     )])
-        return totalDivergence / numWater
+        numWater = len(self.waterCells)
+        for i in self.waterCells:
+            x = i % self.width
+            y = i // self.width
+            totalDivergence += abs(self.u[self.xy(x+1, y  , 1)] - 
+                                   self.u[self.xy(x  , y  , 1)] + 
+                                   self.v[self.xy(x  , y+1   )] - 
+                                   self.v[self.xy(x  , y     )])
+        return totalDivergence / max(numWater, 1)
 
     def enforceIncompressability(self, averageDensity):
         for _ in range(self.incompressibilityIters):
             #if _ % 5 == 0:
             #    print("Average Divergence in", _, "runs:", self.calculateTotalDivergence())
-            for x in range(self.width):
-                for y in range(self.height):
-                    if (self.notSolid[self.xy(x, y)]):
-                        sur = self.notSolidU[self.xy(x+1, y  , 1)]
-                        sul = self.notSolidU[self.xy(x  , y  , 1)]
-                        svd = self.notSolidV[self.xy(x  , y+1   )]
-                        svu = self.notSolidV[self.xy(x  , y     )]
+            for i in self.waterCells:
+                x = i % self.width
+                y = i // self.width
+                sur = self.notSolidU[self.xy(x+1, y  , 1)]
+                sul = self.notSolidU[self.xy(x  , y  , 1)]
+                svd = self.notSolidV[self.xy(x  , y+1   )]
+                svu = self.notSolidV[self.xy(x  , y     )]
                     
-                        divergence = (self.u[self.xy(x+1, y  , 1)] -
-                                      self.u[self.xy(x  , y  , 1)] +
-                                      self.v[self.xy(x  , y+1   )] - 
-                                      self.v[self.xy(x  , y     )])
-                                     
-                                       
-                        s = sul + sur + svd + svu
-                        if (s == 0):
-                            continue
-                        
-                        if averageDensity > 0:
-                            compression = self.density[self.xy(x, y)] - averageDensity
-                            if compression > 0:
-                                divergence -= 1 * compression
-
-                        divergence = -divergence / s
-
-                        self.u[self.xy(x+1, y  , 1)] += (divergence * sur)
-                        self.u[self.xy(x  , y  , 1)] -= (divergence * sul)
-                        self.v[self.xy(x  , y+1   )] += (divergence * svd)
-                        self.v[self.xy(x  , y     )] -= (divergence * svu)
+                divergence = (self.u[self.xy(x+1, y  , 1)] -
+                              self.u[self.xy(x  , y  , 1)] +
+                              self.v[self.xy(x  , y+1   )] - 
+                              self.v[self.xy(x  , y     )])
+                             
+                               
+                s = sul + sur + svd + svu
+                if (s == 0):
+                    continue
+                
+                if averageDensity > 0:
+                    compression = self.density[self.xy(x, y)] - averageDensity
+                    if compression > 0:
+                        divergence -= 1 * compression
+
+                divergence = -divergence / s
+
+                self.u[self.xy(x+1, y  , 1)] += (divergence * sur)
+                self.u[self.xy(x  , y  , 1)] -= (divergence * sul)
+                self.v[self.xy(x  , y+1   )] += (divergence * svd)
+                self.v[self.xy(x  , y     )] -= (divergence * svu)
@@ -0,0 +1,397 @@
+import numpy as np
+from .pressureSolvers import PressureSystem, makePressureSolver
+from .spatialHash import CellIndex
+from .profiling import runStage
+from .obstacles import ObstacleSet
+
+class Fluid():
+    """
+    Array-backed version of water3.Fluid. Particles and grid fields are flat
+    NumPy arrays using the same xy() layout, and every stage works on all
+    particles at once instead of calling interp one particle at a time.
+
+    Flags are stored one byte each and the grid fields are filled in place
+    every step. compact=True also keeps particle and velocity data in
+    float32, roughly halving memory per particle; see memoryUsage().
+
+    With minPerCell/maxPerCell set, reseed() keeps every water cell between
+    those particle counts, so numParticles and the particle arrays follow
+    the water volume instead of staying at the initial count.
+    """
+    def __init__(self, width, height, gravity, dt, numParticles, incompressibilityIters, overCompression=1.0, seed=None, pressureSolver=None,
+                 particleRadius=0.2, separationIters=2, sortInterval=10, profiler=None, cfl=None, maxSubsteps=16,
+                 compact=False, warmStart=True, minPerCell=None, maxPerCell=None):
+        self.numCells = width * height
+        self.numCellsU = (width+1) * height
+        self.numCellsV = width * (height+1)
+        self.gravity = gravity * dt
+
+        self.width = width
+        self.height = height
+        self.dt = dt
+        self.numParticles = numParticles
+        self.incompressibilityIters = incompressibilityIters
+        self.overCompression = overCompression
+        self.particleRadius = particleRadius
+        self.separationIters = separationIters
+        self.sortInterval = sortInterval
+        # with cfl set, each sim() call covers dt in as few substeps as keep
+        # particles within cfl cells per substep
+        self.cfl = cfl
+        self.maxSubsteps = maxSubsteps
+        self.lastSubsteps = 1
+        self.compact = compact
+        self.dtype = np.float32 if compact else np.float64
+        self.frame = 0
+        self.profiler = profiler
+        self.rng = np.random.default_rng(seed)
+        self.pressureSolver = makePressureSolver(pressureSolver)
+        self.solverIterations = 0
+        self.solverResidual = 0.0
+        # last solved pressure of every cell, zero outside the water; with
+        # warmStart it is the initial guess of the next solve
+        self.warmStart = warmStart
+        self.minPerCell = minPerCell
+        self.maxPerCell = maxPerCell
+
+        self.u = np.zeros(self.numCellsU, dtype=self.dtype)
+        self.v = np.zeros(self.numCellsV, dtype=self.dtype)
+        self.density = np.zeros(self.numCells, dtype=self.dtype)
+        self.pressure = np.zeros(self.numCells)
+        self.weightsU = np.zeros(self.numCellsU, dtype=self.dtype)
+        self.weightsV = np.zeros(self.numCellsV, dtype=self.dtype)
+
+        self.notSolid = np.ones(self.numCells, dtype=bool)
+        self.notSolidU = np.zeros(self.numCellsU, dtype=np.uint8)
+        self.notSolidV = np.zeros(self.numCellsV, dtype=np.uint8)
+        # velocity of closed faces, non-zero next to moving obstacles
+        self.solidU = np.zeros(self.numCellsU, dtype=self.dtype)
+        self.solidV = np.zeros(self.numCellsV, dtype=self.dtype)
+
+        self.isWater = np.zeros(self.numCells, dtype=bool)
+        self.isWaterU = np.zeros(self.numCellsU, dtype=np.uint8)
+        self.isWaterV = np.zeros(self.numCellsV, dtype=np.uint8)
+        self.waterCells = np.zeros(0, dtype=int)
+
+        self.particleX = self.rng.uniform(3, int(width/3*2)-4, numParticles).astype(self.dtype, copy=False)
+        self.particleY = self.rng.uniform(3, height-4, numParticles).astype(self.dtype, copy=False)
+        self.particleU = np.zeros(numParticles, dtype=self.dtype)
+        self.particleV = np.zeros(numParticles, dtype=self.dtype)
+        # sortParticles gathers into this before copying back
+        self.particleScratch = np.zeros(numParticles, dtype=self.dtype)
+        self.cellIndex = CellIndex(width, height)
+
+        self.initSolids()
+        self.obstacles = ObstacleSet(width, height, ~self.notSolid)
+
+    def initSolids(self):
+        notSolid = np.ones((self.height, self.width), dtype=bool)
+        notSolid[0, :] = False
+        notSolid[-1, :] = False
+        notSolid[:, 0] = False
+        notSolid[:, -1] = False
+
+        notSolidU = np.ones((self.height, self.width+1), dtype=np.uint8)
+        notSolidU[:, 1:] *= notSolid
+        notSolidU[:, :-1] *= notSolid
+        notSolidV = np.ones((self.height+1, self.width), dtype=np.uint8)
+        notSolidV[1:, :] *= notSolid
+        notSolidV[:-1, :] *= notSolid
+
+        self.notSolid = notSolid.ravel()
+        self.notSolidU = notSolidU.ravel()
+        self.notSolidV = notSolidV.ravel()
+
+    def maxSpeed(self):
+        if self.numParticles == 0:
+            return 0.0
+        return float(max(np.abs(self.particleU).max(), np.abs(self.particleV).max()))
+
+    def substepSize(self, remaining):
+        # the largest even split of the remaining time that keeps every
+        # particle, including what gravity adds over the substep, under cfl
+        if not self.cfl:
+            return remaining
+        speed = self.maxSpeed() + np.abs(self.gravity).max() * remaining / self.dt
+        steps = min(max(int(np.ceil(speed * remaining / self.cfl)), 1), self.maxSubsteps - self.lastSubsteps)
+        return remaining / steps
+
+    def sim(self):
+        # with a profiler attached every stage is timed, otherwise runStage
+        # just calls through
+        stage = runStage if self.profiler is None else self.profiler.stage
+
+        stage("updateObstacles", self.updateObstacles)
+
+        self.lastSubsteps = 0
+        remaining = self.dt
+        while remaining > 1e-9 * self.dt:
+            dt = self.substepSize(remaining)
+            self.lastSubsteps += 1
+            self.substep(stage, dt)
+            remaining -= dt
+        self.frame += 1
+
+        if self.profiler is not None:
+            self.profiler.endStep(solverIterations=self.solverIterations,
+                                  solverResidual=self.solverResidual,
+                                  divergence=float(self.calculateTotalDivergence()),
+                                  substeps=self.lastSubsteps)
+
+    def substep(self, stage, dt):
+        width, height = self.width, self.height
+
+        stage("move", self.move, dt, width, height)
+        stage("separateParticles", self.separateParticles, self.separationIters)
+        stage("updateWaterUV", self.updateWaterUV, width, height)
+        if self.minPerCell or self.maxPerCell:
+            stage("reseed", self.reseed)
+        stage("particlesToGrid", self.particlesToGrid, width, height)
+        stage("enforceSolidUV", self.enforceSolidUV)
+        averageDensity = stage("updateDensity", self.updateDensity, width, height)
+        stage("enforceIncompressability", self.enforceIncompressability, averageDensity)
+        stage("gridToParticles", self.gridToParticles, width, height)
+
+    def move(self, dt, width, height):
+        # gravity is the velocity gained over a full dt
+        self.particleV += self.gravity if dt == self.dt else self.gravity * dt / self.dt
+        self.particleX += self.particleU * dt
+        self.particleY += self.particleV * dt
+
+        width -= 1
+        height -= 1
+        clampX = (self.particleX < 1) | (self.particleX > width)
+        clampY = (self.particleY < 0) | (self.particleY > height)
+        np.clip(self.particleX, 1, width, out=self.particleX)
+        np.clip(self.particleY, 0, height, out=self.particleY)
+        self.particleU[clampX] = 0
+        self.particleV[clampY] = 0
+
+        if self.obstacles.shapes:
+            self.obstacles.pushOut(self.particleX, self.particleY, self.particleU, self.particleV)
+
+    def separateParticles(self, numIters):
+        # push overlapping particles apart, finding neighbours through the
+        # cell index instead of testing every pair
+        minDist = 2 * self.particleRadius
+        for _ in range(numIters):
+            self.cellIndex.build(self.particleX, self.particleY)
+            i, j = self.cellIndex.neighbourPairs()
+
+            dx = self.particleX[j] - self.particleX[i]
+            dy = self.particleY[j] - self.particleY[i]
+            d2 = dx * dx + dy * dy
+            close = (d2 < minDist * minDist) & (d2 > 0)
+            i, j, dx, dy, d2 = i[close], j[close], dx[close], dy[close], d2[close]
+
+            d = np.sqrt(d2)
+            s = 0.5 * (minDist - d) / d
+            self.particleX += np.bincount(j, s * dx, self.numParticles) - np.bincount(i, s * dx, self.numParticles)
+            self.particleY += np.bincount(j, s * dy, self.numParticles) - np.bincount(i, s * dy, self.numParticles)
+
+        if numIters > 0:
+            np.clip(self.particleX, 1, self.width - 1, out=self.particleX)
+            np.clip(self.particleY, 0, self.height - 1, out=self.particleY)
+            if self.obstacles.shapes:
+                self.obstacles.pushOut(self.particleX, self.particleY, self.particleU, self.particleV)
+
+    def sortParticles(self):
+        # reorder particle arrays by cell so scatter and gather walk the grid
+        # in memory order
+        order = self.cellIndex.order
+        if self.particleScratch.shape != order.shape:
+            self.particleScratch = np.zeros(order.shape, dtype=self.particleX.dtype)
+        scratch = self.particleScratch
+        for particles in (self.particleX, self.particleY, self.particleU, self.particleV):
+            np.take(particles, order, out=scratch)
+            particles[:] = scratch
+        self.cellIndex.particleCell = self.cellIndex.particleCell[order]
+        self.cellIndex.order = np.arange(self.numParticles)
+
+    def reseed(self):
+        # drop particles above maxPerCell and spawn new ones, with the mean
+        # velocity of their cell, in water cells below minPerCell; uses the
+        # cell index updateWaterUV just built
+        index = self.cellIndex
+        counts = index.counts()
+        keep = np.ones(self.numParticles, dtype=bool)
+        if self.maxPerCell:
+            sortedCell = index.particleCell[index.order]
+            rank = np.arange(self.numParticles) - index.cellStart[sortedCell]
+            keep[index.order[rank >= self.maxPerCell]] = False
+
+        spawn = np.zeros(0, dtype=int)
+        if self.minPerCell:
+            short = np.flatnonzero((counts > 0) & (counts < self.minPerCell) & self.notSolid)
+            spawn = np.repeat(short, self.minPerCell - counts[short])
+
+        if keep.all() and len(spawn) == 0:
+            return
+
+        cells = index.particleCell
+        meanU = np.bincount(cells, self.particleU, self.numCells)[spawn] / counts[spawn]
+        meanV = np.bincount(cells, self.particleV, self.numCells)[spawn] / counts[spawn]
+        y, x = np.divmod(spawn, self.width)
+        new = (x + self.rng.random(len(spawn)), y + self.rng.random(len(spawn)), meanU, meanV)
+
+        for name, values in zip(("particleX", "particleY", "particleU", "particleV"), new):
+            setattr(self, name, np.concatenate((getattr(self, name)[keep], values.astype(self.dtype))))
+        self.numParticles = len(self.particleX)
+        index.build(self.particleX, self.particleY)
+
+    def xy(self, x, y, isU=0):
+        return x + y * (self.width + isU)
+
+    def enforceSolidUV(self):
+        # every closed face, including those of solid cells particles were
+        # clamped into, since gridToParticles reads all of isWaterU/V
+        self.u *= self.notSolidU
+        self.u += self.solidU
+        self.v *= self.notSolidV
+        self.v += self.solidV
+
+    def updateObstacles(self):
+        # refresh only the cells the obstacles changed and their faces
+        cells = self.obstacles.takeChanges()
+        if len(cells) == 0:
+            return
+        self.notSolid[cells] = ~self.obstacles.solid[cells]
+        faces, isOpen, wall = self.obstacles.xFaces(cells)
+        self.notSolidU[faces] = isOpen
+        self.solidU[faces] = wall
+        faces, isOpen, wall = self.obstacles.yFaces(cells)
+        self.notSolidV[faces] = isOpen
+        self.solidV[faces] = wall
+
+    def updateWaterUV(self, width, height):
+        self.cellIndex.build(self.particleX, self.particleY)
+        if self.sortInterval and self.frame % self.sortInterval == 0:
+            self.sortParticles()
+
+        isWater = np.greater(self.cellIndex.counts(), 0, out=self.isWater)
+        waterCells = np.flatnonzero(isWater)
+        y = waterCells // width
+
+        isWaterU, isWaterV = self.isWaterU, self.isWaterV
+        isWaterU.fill(0)
+        isWaterV.fill(0)
+        isWaterU[waterCells + y] = 1
+        isWaterU[waterCells + y + 1] = 1
+        isWaterV[waterCells] = 1
+        isWaterV[waterCells + width] = 1
+
+        self.waterCells = np.flatnonzero(isWater & self.notSolid)
+
+    def interpWeights(self, width, height, x, y, isU=0):
+        # bilinear corner indices and weights for every particle at once,
+        # in the same i0..i3 / w0..w3 order as water3.Fluid.interp
+        x = np.minimum(x, width-2+isU)
+        y = np.minimum(y, height-2)
+        ix = x.astype(int)
+        iy = y.astype(int)
+
+        tx = x - ix
+        ty = y - iy
+        sx = 1 - tx
+        sy = 1 - ty
+
+        i0 = ix + iy * (width + isU)
+        i1 = i0 + 1
+        i2 = i1 + width + isU
+        i3 = i2 - 1
+
+        indices = np.stack((i0, i1, i2, i3))
+        weights = np.stack((sx * sy, tx * sy, tx * ty, sx * ty))
+        return indices, weights
+
+    def interp(self, width, height, x, y, val, weights, grid, waterGrid, particleToGrid, isU=0, fillGrid=True):
+        indices, w = self.interpWeights(width, height, x, y, isU)
+        size = len(weights) if particleToGrid else len(grid)
+
+        if particleToGrid:
+            weights += np.bincount(indices.ravel(), w.ravel(), size)
+            if fillGrid:
+                grid += np.bincount(indices.ravel(), (w * val).ravel(), size)
+        else:
+            valid = waterGrid[indices] * w
+            d = valid.sum(axis=0)
+            total = (valid * grid[indices]).sum(axis=0)
+            return np.divide(total, d, out=np.zeros_like(total), where=d > 0)
+
+    def updateDensity(self, width, height):
+        density = self.density
+        density.fill(0)
+        self.interp(width, height, self.particleX, self.particleY, 0, density, 0, 0, 1, 0, False)
+
+        waterCount = np.count_nonzero(self.isWater)
+        densityCount = density[self.isWater].sum()
+        return densityCount / waterCount
+
+    def particlesToGrid(self, width, height):
+        u, v = self.u, self.v
+        u.fill(0)
+        v.fill(0)
+
+        weights = self.weightsU
+        weights.fill(0)
+        self.interp(width, height, self.particleX + 0.5, self.particleY, self.particleU, weights, u, 0, True, 1)
+        np.divide(u, weights, out=u, where=weights > 0)
+
+        weights = self.weightsV
+        weights.fill(0)
+        self.interp(width, height, self.particleX, self.particleY + 0.5, self.particleV, weights, v, 0, True)
+        np.divide(v, weights, out=v, where=weights > 0)
+
+    def gridToParticles(self, width, height):
+        self.particleU[:] = self.interp(width, height, self.particleX + 0.5, self.particleY, 0, 0, self.u, self.isWaterU, False, 1)
+        self.particleV[:] = self.interp(width, height, self.particleX, self.particleY + 0.5, 0, 0, self.v, self.isWaterV, False)
+
+    def memoryUsage(self):
+        # bytes of per-particle and per-cell state, including work buffers
+        particles = (self.particleX, self.particleY, self.particleU, self.particleV, self.particleScratch,
+                     self.cellIndex.particleCell, self.cellIndex.order)
+        cells = (self.u, self.v, self.density, self.weightsU, self.weightsV,
+                 self.notSolid, self.notSolidU, self.notSolidV,
+                 self.isWater, self.isWaterU, self.isWaterV, self.cellIndex.cellStart)
+        particleBytes = sum(a.nbytes for a in particles)
+        cellBytes = sum(a.nbytes for a in cells)
+        return {
+            "particleBytes": particleBytes,
+            "cellBytes": cellBytes,
+            "bytesPerParticle": particleBytes / max(self.numParticles, 1),
+            "bytesPerCell": cellBytes / self.numCells,
+        }
+
+    def close(self):
+        # stops the worker processes of a parallel pressure solver
+        if hasattr(self.pressureSolver, "close"):
+            self.pressureSolver.close()
+
+    def calculateTotalDivergence(self):
+        cells = self.waterCells
+        y = cells // self.width
+        divergence = self.u[cells + y + 1] - self.u[cells + y] + self.v[cells + self.width] - self.v[cells]
+        return np.abs(divergence).sum() / max(len(cells), 1)
+
+    def overDensity(self, cells, averageDensity):
+        # how far cells are packed above the average; the solve spreads them out
+        if averageDensity > 0:
+            return np.maximum(self.density[cells] - averageDensity, 0)
+        return 0
+
+    def pressureSystem(self):
+        return PressureSystem(self.width, self.height, self.waterCells, self.notSolidU, self.notSolidV)
+
+    def enforceIncompressability(self, averageDensity):
+        # incompressibilityIters caps the solve, the solver's tolerance ends it.
+        # Only water cells are solved for, air cells hold zero pressure.
+        system = self.pressureSystem()
+        rhs = system.divergence(self.u, self.v)
+        rhs -= self.overDensity(system.cells, averageDensity)
+
+        guess = self.pressure[system.cells] if self.warmStart else None
+        pressure, self.solverIterations, self.solverResidual = self.pressureSolver.solve(system, rhs, self.incompressibilityIters, guess)
+        system.applyPressure(self.u, self.v, pressure)
+
+        self.pressure.fill(0)
+        self.pressure[system.cells] = pressure
@@ -0,0 +1,174 @@
+"""
+Run a solver without a display and report throughput.
+
+    python headless.py waterNumpy --width 60 --height 20 --particles 3000 --steps 200
+"""
+import argparse
+import random
+import resource
+import sys
+import time
+
+def makeProfiler(args):
+    if not args.trace:
+        return None
+    from fluidsim.profiling import StageProfiler
+    args.profiler = StageProfiler(window=args.steps)
+    return args.profiler
+
+def makeWater3(args):
+    from fluidsim import water3
+    random.seed(args.seed)
+    f = water3.Fluid(args.width, args.height, 2 if args.gravity is None else args.gravity, args.dt, args.particles, args.iters)
+    return f.sim, lambda: f.numParticles
+
+def makeWaterNumpy(args):
+    from fluidsim import waterNumpy
+    f = waterNumpy.Fluid(args.width, args.height, 2 if args.gravity is None else args.gravity, args.dt, args.particles, args.iters, seed=args.seed, profiler=makeProfiler(args), cfl=args.cfl, compact=args.compact,
+                          minPerCell=args.perCell[0], maxPerCell=args.perCell[1])
+    args.memoryUsage = f.memoryUsage
+    from fluidsim.recording import particleFields, gridFields
+    args.recordable = (f, particleFields + gridFields, {"width": f.width, "height": f.height, "particleRadius": f.particleRadius})
+    args.shapes = {"u": (f.height, f.width + 1), "v": (f.height + 1, f.width), "density": (f.height, f.width)}
+    # reseeding changes the count from step to step
+    return f.sim, lambda: f.numParticles
+
+def makeEnsemble(args):
+    from fluidsim.ensemble import FluidEnsemble
+    seeds = range(args.seed, args.seed + args.members)
+    f = FluidEnsemble(args.members, args.width, args.height, 2 if args.gravity is None else args.gravity, args.dt, args.particles, args.iters, seeds=seeds, profiler=makeProfiler(args), cfl=args.cfl, compact=args.compact)
+    return f.sim, lambda: f.numParticles
+
+def makeStaggered(args):
+    from fluidsim import eulerianStaggeredGrid
+    gravity = (0.98 if args.gravity is None else args.gravity, 0)
+    grid = eulerianStaggeredGrid.StaggeredGrid(args.height, args.width, gravity, timeStep=args.dt, iterations=args.iters, seed=args.seed, profiler=makeProfiler(args), workers=args.workers, cfl=args.cfl)
+    from fluidsim.recording import gridFields
+    args.recordable = (grid, gridFields, {"densityScale": grid.densityMultiplier})
+    return grid.step, lambda: 0
+
+def makeEulerian(args):
+    from fluidsim import eulerianGrid
+    if args.width != args.height:
+        raise ValueError("eulerianGrid only supports square grids")
+    eulerianGrid.gridPoint.initializeGrid(args.width, args.height)
+    return eulerianGrid.gridPoint.nextFrame, lambda: 0
+
+def makeEulerianArray(args):
+    from fluidsim.eulerianArrayGrid import ArrayGrid
+    grid = ArrayGrid(args.width, args.height)
+    return grid.nextFrame, lambda: 0
+
+solvers = {
+    "water3": makeWater3,
+    "waterNumpy": makeWaterNumpy,
+    "ensemble": makeEnsemble,
+    "staggered": makeStaggered,
+    "eulerian": makeEulerian,
+    "eulerianArray": makeEulerianArray,
+}
+
+def peakMemoryBytes():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def recorded(step, args):
+    # record after every step, encoding and writing on the recorder's thread
+    if args.recordable is None:
+        raise ValueError("--record is only supported for waterNumpy and staggered")
+    from fluidsim.recording import Recorder
+    source, names, meta = args.recordable
+    args.recorder = Recorder(args.record, source, names, meta=meta)
+
+    def recordedStep():
+        step()
+        args.recorder.record()
+    return recordedStep
+
+def served(step, args):
+    # publish after every step; clients that fall behind miss frames
+    if args.recordable is None:
+        raise ValueError("--serve is only supported for waterNumpy and staggered")
+    from fluidsim.frameServer import FrameServer
+    source, names, meta = args.recordable
+    args.server = FrameServer(source, names, port=args.serve, shapes=args.shapes, meta=meta)
+    print("serving frames on port %d" % args.server.port)
+
+    def servedStep():
+        step()
+        args.server.publish()
+    return servedStep
+
+def run(args):
+    if args.perCell[0] is not None and args.solver != "waterNumpy":
+        raise ValueError("--per-cell is only supported for waterNumpy")
+    step, particleCount = solvers[args.solver](args)
+    if args.record:
+        step = recorded(step, args)
+    if args.serve is not None:
+        step = served(step, args)
+
+    start = time.perf_counter()
+    particleUpdates = 0
+    for _ in range(args.steps):
+        step()
+        particleUpdates += particleCount()
+    if args.recorder is not None:
+        args.recorder.close()
+    if args.server is not None:
+        args.server.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "solver": args.solver,
+        "steps": args.steps,
+        "seconds": elapsed,
+        "stepsPerSecond": args.steps / elapsed,
+        "cellUpdatesPerSecond": args.steps * args.members * args.width * args.height / elapsed,
+        "particleUpdatesPerSecond": particleUpdates / elapsed,
+        "peakMemoryBytes": peakMemoryBytes(),
+        "stateMemory": args.memoryUsage() if args.memoryUsage else None,
+    }
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Run a fluid solver headless and report throughput.")
+    parser.add_argument("solver", choices=sorted(solvers))
+    parser.add_argument("--width", type=int, default=60)
+    parser.add_argument("--height", type=int, default=20)
+    parser.add_argument("--particles", type=int, default=3000)
+    parser.add_argument("--gravity", type=float, default=None, help="defaults to each solver's own value")
+    parser.add_argument("--dt", type=float, default=0.5)
+    parser.add_argument("--iters", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--members", type=int, default=1, help="scenes in one ensemble, seeded --seed, --seed + 1, ...")
+    parser.add_argument("--compact", action="store_true", help="float32 particle and velocity data for waterNumpy")
+    parser.add_argument("--per-cell", dest="perCell", type=int, nargs=2, metavar=("MIN", "MAX"), default=(None, None),
+                        help="reseed waterNumpy particles to keep every water cell within MIN..MAX")
+    parser.add_argument("--cfl", type=float, default=None, help="adaptive substepping for waterNumpy and staggered")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for staggered")
+    parser.add_argument("--record", help="record every step to this file (waterNumpy and staggered), see replay.py")
+    parser.add_argument("--serve", type=int, help="publish every step on this local port (0 for any), see watch.py")
+    parser.add_argument("--trace", help="write a per-stage Chrome trace here (waterNumpy and staggered only)")
+    parser.set_defaults(recordable=None, recorder=None, shapes=None, server=None, members=1, profiler=None, workers=None, cfl=None, compact=False, memoryUsage=None)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parseArgs(argv)
+    stats = run(args)
+    print("%-22s %s" % ("solver", stats["solver"]))
+    print("%-22s %d in %.3f s" % ("steps", stats["steps"], stats["seconds"]))
+    print("%-22s %.2f" % ("steps/sec", stats["stepsPerSecond"]))
+    print("%-22s %.0f" % ("cell-updates/sec", stats["cellUpdatesPerSecond"]))
+    print("%-22s %.0f" % ("particle-updates/sec", stats["particleUpdatesPerSecond"]))
+    print("%-22s %.1f MiB" % ("peak memory", stats["peakMemoryBytes"] / 2**20))
+    if stats["stateMemory"] is not None:
+        print("%-22s %.1f" % ("bytes/particle", stats["stateMemory"]["bytesPerParticle"]))
+        print("%-22s %.1f" % ("bytes/cell", stats["stateMemory"]["bytesPerCell"]))
+    if args.profiler is not None:
+        print(args.profiler.report())
+        args.profiler.exportTrace(args.trace)
+
+if __name__ == "__main__":
+    main()
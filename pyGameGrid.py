@@ -1,86 +1,96 @@
 # ...existing code...
-import pygame
 import numpy as np
-import math
-import colorsys
-import eulerianGrid as eg
-import sys
+from fluidsim.eulerianArrayGrid import ArrayGrid
+from fluidsim.gridRenderer import GridRenderer
 import time
+import argparse
 
-# --- Pygame Setup ---
-pygame.init()
+# --- Window and Grid Settings ---
 WIDTH, HEIGHT = 600, 600
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-clock = pygame.time.Clock()
-
-# --- Grid Settings ---
 rows, cols = 100, 100
-cell_w = WIDTH / cols
-cell_h = HEIGHT / rows
 
-# initialize class-level grid in eulerianGrid (matches eg.gridPoint.initializeGrid signature)
-eg.gridPoint.initializeGrid(rows, cols)
+def fieldViews(grid):
+    # --- Velocity Field (vx, vy) ---
+    # IMPORTANT vx is y and vy is x (shoutout I setup the grid sideways)
+    # views onto the grid's own arrays: vx[cols-j-1, i] is velocity[i, j, 1]
+    vx = grid.velocity[:, ::-1, 1].T
+    vy = grid.velocity[:, ::-1, 0].T
+    vd = grid.density[:, ::-1].T
+    return vx, vy, vd
+
+def divergenceView(grid):
+    # central-difference divergence in the same orientation as fieldViews
+    velocity = grid.velocity
+    divergence = np.gradient(velocity[:, :, 0], axis=0) + np.gradient(velocity[:, :, 1], axis=1)
+    return divergence[:, ::-1].T
 
-# --- Velocity Field (vx, vy) (kept for fast drawing) ---
-# IMPORTANT vx is y and vy is x (shoutout I setup the grid sideways)
-vx = np.zeros((cols, rows), dtype=np.float32)
-vy = np.zeros((cols, rows), dtype=np.float32)
-vd = np.zeros((cols, rows), dtype=np.float32)
+def drawGrid(screen, renderer, grid):
+    # grid is an ArrayGrid or a viewer snapshot of its velocity and density
+    vx, vy, vd = fieldViews(grid)
+    if renderer.mode == "velocity":
+        renderer.draw(screen, vx, vy)
+    elif renderer.mode == "divergence":
+        renderer.draw(screen, divergenceView(grid))
+    else:
+        renderer.draw(screen, vd)
 
-def somethingToColor(x):
-    x = max(-60, min(60, x))
-    r = int((1 - 2**(-x/1000))*255)
-    return r,r,r
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ArrayGrid fields in a pygame window.")
+    parser.add_argument("--mode", choices=GridRenderer.modes, default="density")
+    parser.add_argument("--threaded", action="store_true",
+                        help="step the grid in its own thread and draw the latest frame")
+    parser.add_argument("--fps", type=int, default=30, help="render rate cap with --threaded")
+    parser.add_argument("--serve", type=int, help="also publish every step on this local port, see watch.py")
+    args = parser.parse_args(argv)
 
-def velocityToColor(vx_val, vy_val):
-    """
-    Convert velocity vector to RGB color based on direction (HSV hue) and magnitude.
-    """
-    angle = math.atan2(vy_val, vx_val)  # range: [-pi, pi]
-    hue = (angle + math.pi) / (2 * math.pi)  # map to [0, 1]
-    mag = math.sqrt(vx_val**2 + vy_val**2)
-    brightness = min(1.0, mag * 2.0)  # adjust scaling if needed
-    r, g, b = colorsys.hsv_to_rgb(hue, 1.0, brightness)
-    return int(r * 255), int(g * 255), int(b * 255)
+    renderer = GridRenderer(args.mode)
+    grid = ArrayGrid(rows, cols)
 
-def drawVelocityField():
-    for i in range(rows):
-        for j in range(cols):
-            #color = velocityToColor(vx[i, j], vy[i, j])
-            color = somethingToColor(vd[i, j])
-            if i == 2 and j == 80:
-                color = 100,5,50
-            rect = pygame.Rect(int(j * cell_w), int(i * cell_h), int(cell_w) + 1, int(cell_h) + 1)
-            pygame.draw.rect(screen, color, rect)
+    step = grid.nextFrame
+    server = None
+    if args.serve is not None:
+        from fluidsim.frameServer import FrameServer
+        # ArrayGrid fields are [x, y] with y up
+        server = FrameServer(grid, ("density", "velocity"), port=args.serve, meta={"flipY": True})
+        print("serving frames on port %d" % server.port)
 
-def updateVelocityField():
-    # try to advance the physics in the eulerianGrid if available
-    eg.gridPoint.nextFrame()
+        def step():
+            grid.nextFrame()
+            server.publish()
 
-    # copy velocities from the class-level grid into local arrays for drawing
-    
-    for i in range(rows):
-        for j in range(cols):
-            v = eg.gridPoint.grid[i][j]
-            vx[cols-j-1, i] = float(v.velocity[1])
-            vy[cols-j-1, i] = float(v.velocity[0])
-            vd[cols-j-1, i] = float(v.density)
+    if args.threaded:
+        from fluidsim.viewer import runViewer
+        rates = runViewer(step, grid, ("velocity", "density"),
+                          lambda screen, frame: drawGrid(screen, renderer, frame), (WIDTH, HEIGHT), fps=args.fps)
+        print("%.1f steps/sec, %.1f frames/sec" % (rates["simulationRate"], rates["renderRate"]))
+        if server is not None:
+            server.close()
+        return
 
+    import pygame
 
-# --- Main Loop ---
-running = True
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-    updateVelocityField()
-    drawVelocityField()
-    pygame.display.flip()
-    time.sleep(0.01)
-    print("\n-----------------------------------\n")
-    #sys.quit
+    # --- Pygame Setup ---
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    clock = pygame.time.Clock()
 
+    # --- Main Loop ---
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+        step()
+        drawGrid(screen, renderer, grid)
+        pygame.display.flip()
+        time.sleep(0.01)
+        print("\n-----------------------------------\n")
+        #sys.quit
 
+    pygame.quit()
+    if server is not None:
+        server.close()
 
-pygame.quit()
-# ...existing code...
\ No newline at end of file
+if __name__ == "__main__":
+    main()
+# ...existing code...
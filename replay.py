@@ -0,0 +1,91 @@
+"""
+Play a recording back without simulating.
+
+    python headless.py waterNumpy --steps 300 --record run.fsr
+    python replay.py run.fsr --fps 30
+
+Recordings with particles are drawn like water4.py, others as a greyscale
+density image. Frames are read straight from the file, so seeking with the
+arrow keys costs the same as playing forward. Space pauses.
+"""
+import argparse
+from types import SimpleNamespace
+
+import numpy as np
+
+from fluidsim.recording import Recording
+
+def densityImage(density, meta):
+    # (x, y) greyscale image; Fluid grids (meta with a width) are (y, x),
+    # and flipY grids have y pointing up
+    if density.ndim == 1:
+        density = density.reshape(meta["height"], meta["width"])
+    if "width" in meta:
+        density = density.T
+    if meta.get("flipY"):
+        density = density[:, ::-1]
+    scale = meta.get("densityScale") or max(float(np.abs(density).max()), 1e-9)
+    grey = np.uint8(255 / (1 + np.exp(-density / scale)))
+    return np.stack([grey] * 3, axis=-1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play back a fluid recording.")
+    parser.add_argument("path")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--resolution", type=int, default=20, help="pixels per cell for particle recordings")
+    parser.add_argument("--loop", action="store_true")
+    args = parser.parse_args(argv)
+
+    import pygame
+
+    recording = Recording(args.path)
+    meta = recording.meta
+    particles = "particleX" in recording.fields
+    if particles:
+        from fluidsim.particleRenderer import ParticleRenderer
+        renderer = ParticleRenderer(meta["width"], meta["height"], args.resolution,
+                                    meta.get("particleRadius", 0.2), colourBy="speed")
+        size = (meta["width"] * args.resolution, meta["height"] * args.resolution)
+    else:
+        size = densityImage(recording[0]["density"], meta).shape[:2]
+
+    pygame.init()
+    screen = pygame.display.set_mode(size)
+    clock = pygame.time.Clock()
+
+    i = 0
+    paused = False
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_RIGHT:
+                    i = min(i + args.fps, len(recording) - 1)
+                elif event.key == pygame.K_LEFT:
+                    i = max(i - args.fps, 0)
+
+        frame = recording[i]
+        if particles:
+            renderer.draw(screen, SimpleNamespace(width=meta["width"], numCells=meta["width"] * meta["height"], **frame))
+        else:
+            screen.blit(pygame.surfarray.make_surface(densityImage(frame["density"], meta)), (0, 0))
+        pygame.display.set_caption("%s  %d/%d" % (args.path, i + 1, len(recording)))
+        pygame.display.flip()
+
+        if not paused:
+            i += 1
+            if i == len(recording):
+                if not args.loop:
+                    running = False
+                i = 0
+        clock.tick(args.fps)
+
+    pygame.quit()
+    recording.close()
+
+if __name__ == "__main__":
+    main()
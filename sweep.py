@@ -0,0 +1,149 @@
+"""
+Parameter sweeps for the particle solvers over a process pool.
+
+    python sweep.py --param gravity=1,2,4 --param dt=0.25,0.5 --seeds 0,1 --steps 200 --out sweep.jsonl
+
+Every combination of the --param values is run once per seed. Each finished
+run is appended to --out as one JSON line, so a sweep that was stopped can
+be started again with the same arguments and only the missing runs are done.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Fluid's constructor arguments and the values a sweep starts from
+defaults = {
+    "width": 60,
+    "height": 20,
+    "gravity": 2,
+    "dt": 0.5,
+    "numParticles": 3000,
+    "incompressibilityIters": 30,
+    "overCompression": 1.0,
+}
+
+def makeFluid(solver, params, seed):
+    if solver == "water3":
+        from fluidsim import water3
+        random.seed(seed)
+        return water3.Fluid(**params)
+    from fluidsim import waterNumpy
+    return waterNumpy.Fluid(seed=seed, **params)
+
+def waterDensity(f):
+    if isinstance(f.density, list):
+        water = [d for d, isWater in zip(f.density, f.isWater) if isWater]
+        return sum(water) / len(water) if water else 0.0
+    water = f.density[f.isWater.astype(bool)]
+    return float(water.mean()) if len(water) else 0.0
+
+def runOne(solver, params, seed, steps):
+    f = makeFluid(solver, params, seed)
+
+    # only sim() is timed; the metrics are taken between steps
+    divergence = 0.0
+    densities = []
+    elapsed = 0.0
+    for _ in range(steps):
+        start = time.perf_counter()
+        f.sim()
+        elapsed += time.perf_counter() - start
+        divergence += float(f.calculateTotalDivergence())
+        densities.append(float(waterDensity(f)))
+
+    return {
+        "seconds": elapsed,
+        "stepsPerSecond": steps / elapsed,
+        "meanDivergence": divergence / steps,
+        # change of the mean water-cell density from the first to the last step
+        "densityDrift": (densities[-1] - densities[0]) / densities[0] if densities[0] else 0.0,
+    }
+
+def parseValue(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def parseGrid(specs):
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if not values:
+            raise ValueError("expected name=value,value,... not %r" % spec)
+        grid[name] = [parseValue(v) for v in values.split(",")]
+    return grid
+
+def runKey(run):
+    return json.dumps([run["solver"], run["params"], run["seed"], run["steps"]], sort_keys=True)
+
+def plannedRuns(args):
+    grid = parseGrid(args.param)
+    names = sorted(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(defaults, **dict(zip(names, values)))
+        for seed in args.seeds:
+            yield {"solver": args.solver, "params": params, "seed": seed, "steps": args.steps}
+
+def completedKeys(path):
+    # runs that failed are not in here and are tried again
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # a line cut short when the sweep was killed
+                continue
+            if "error" not in result:
+                done.add(result["key"])
+    return done
+
+def sweep(args):
+    done = completedKeys(args.out)
+    runs = [run for run in plannedRuns(args) if runKey(run) not in done]
+    swept = sorted(parseGrid(args.param))
+    print("%d runs, %d already done" % (len(runs) + len(done), len(done)))
+
+    with open(args.out, "a+") as out, ProcessPoolExecutor(args.workers) as pool:
+        if out.tell() > 0:
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n")
+        futures = {pool.submit(runOne, run["solver"], run["params"], run["seed"], run["steps"]): run for run in runs}
+        for count, future in enumerate(as_completed(futures), 1):
+            run = futures[future]
+            result = dict(run, key=runKey(run))
+            try:
+                result.update(future.result())
+                summary = "%.2f steps/sec, divergence %.4g, drift %+.3f" % (
+                    result["stepsPerSecond"], result["meanDivergence"], result["densityDrift"])
+            except Exception as e:
+                result["error"] = repr(e)
+                summary = "failed: %s" % result["error"]
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            label = " ".join("%s=%s" % (name, run["params"][name]) for name in swept)
+            print("[%d/%d] %s seed=%s: %s" % (count, len(runs), label, run["seed"], summary))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep Fluid parameters over a process pool.")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="constructor argument and the values to try; repeat for more")
+    parser.add_argument("--solver", choices=("waterNumpy", "water3"), default="waterNumpy")
+    parser.add_argument("--seeds", type=lambda text: [int(s) for s in text.split(",")], default=[0])
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPUs")
+    parser.add_argument("--out", default="sweep.jsonl")
+    sweep(parser.parse_args(argv))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
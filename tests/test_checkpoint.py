@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from fluidsim.checkpoint import loadCheckpoint, saveCheckpoint
+from fluidsim.obstacles import Box
+from fluidsim.waterNumpy import Fluid
+
+fields = ("particleX", "particleY", "particleU", "particleV", "u", "v")
+
+def assertSameState(a, b):
+    for name in fields:
+        np.testing.assert_array_equal(getattr(a, name), getattr(b, name), err_msg=name)
+
+@pytest.mark.parametrize("mmap", [True, False])
+def testRoundTripContinuesIdentically(tmp_path, mmap):
+    fluid = Fluid(24, 12, 2, 0.5, 600, 30, seed=3, minPerCell=2, maxPerCell=8)
+    box = fluid.obstacles.add(Box(4, 3, 7, 6), (0.5, 0))
+    for _ in range(4):
+        fluid.sim()
+    path = tmp_path / "fluid.ck"
+    saveCheckpoint(fluid, path)
+    restored = loadCheckpoint(path, mmap=mmap)
+    assertSameState(fluid, restored)
+
+    for k in range(5):
+        for f in (fluid, restored):
+            f.obstacles.move(box, Box(5 + k, 3, 8 + k, 6))
+            f.sim()
+        assertSameState(fluid, restored)
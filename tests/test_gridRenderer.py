@@ -0,0 +1,17 @@
+import numpy as np
+
+from fluidsim.gridRenderer import GridRenderer, somethingToColor, velocityToColor
+
+def testDensityWithinOneGreyLevel():
+    # every bin edge and values clamped at both ends
+    x = np.concatenate((np.linspace(-60, 60, 20001), [-80, -60.0001, 60.0001, 80]))
+    image = GridRenderer("density").colours(x[None, :])[:, 0].astype(int)
+    expected = np.clip([somethingToColor(value) for value in x], 0, 255)
+    assert np.abs(image - expected).max() <= 1
+
+def testVelocityWithinTableStep():
+    rng = np.random.default_rng(0)
+    vx, vy = rng.normal(0, 0.4, (2, 5000))
+    image = GridRenderer("velocity").colours(vx[None, :], vy[None, :])[:, 0].astype(int)
+    expected = np.array([velocityToColor(a, b) for a, b in zip(vx, vy)])
+    assert np.abs(image - expected).max() <= 10
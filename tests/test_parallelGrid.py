@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from fluidsim.eulerianStaggeredGrid import StaggeredGrid
+from fluidsim.parallelGrid import TilePool
+
+def testPooledMatchesSerial():
+    serial = StaggeredGrid(24, 24, seed=1, iterations=300, tolerance=1e-3)
+    pooled = StaggeredGrid(24, 24, seed=1, iterations=300, tolerance=1e-3, workers=2)
+    try:
+        for _ in range(3):
+            serial.step()
+            pooled.step()
+            assert pooled.divergenceIterations == serial.divergenceIterations
+            np.testing.assert_allclose(pooled.u, serial.u, rtol=0, atol=1e-9)
+            np.testing.assert_allclose(pooled.v, serial.v, rtol=0, atol=1e-9)
+            np.testing.assert_allclose(pooled.density, serial.density, rtol=0, atol=1e-9)
+    finally:
+        pooled.close()
+
+def testExitedWorkerRaises():
+    with TilePool(12, 12, 3) as pool:
+        pool.processes[1].kill()
+        pool.processes[1].join()
+        # the surviving workers' replies are drained, so the next command
+        # fails the same way instead of reading a stale reply
+        for _ in range(2):
+            with pytest.raises(RuntimeError, match="worker 1 exited"):
+                pool.broadcast("relax", (2, "after"))
@@ -0,0 +1,68 @@
+"""
+Watch a simulation served by another process.
+
+    python headless.py waterNumpy --steps 100000 --serve 5000
+    python watch.py 5000
+    python watch.py 5000 --field density --stride 2 --every 5
+
+Any number of watchers can attach to one run. A watcher that draws slower
+than the run steps simply skips frames; the caption shows how many.
+"""
+import argparse
+from types import SimpleNamespace
+
+from fluidsim.frameServer import FrameClient
+from replay import densityImage
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Draw frames from a running frame server.")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--field", choices=("particles", "density"), default=None,
+                        help="defaults to particles when the server has them")
+    parser.add_argument("--stride", type=int, default=1, help="keep every stride-th cell or particle")
+    parser.add_argument("--every", type=int, default=1, help="only every n-th step")
+    parser.add_argument("--resolution", type=int, default=None, help="pixels per cell, 20 for particles and 4 for density")
+    args = parser.parse_args(argv)
+
+    probe = FrameClient(args.port, host=args.host)
+    meta, available = probe.meta, probe.fields
+    probe.close()
+    if args.field is None:
+        args.field = "particles" if "particleX" in available else "density"
+    fields = ["particleX", "particleY", "particleU", "particleV"] if args.field == "particles" else ["density"]
+    if args.resolution is None:
+        args.resolution = 20 if args.field == "particles" else 4
+    client = FrameClient(args.port, fields, every=args.every, stride=args.stride, host=args.host)
+
+    import pygame
+
+    if args.field == "particles":
+        from fluidsim.particleRenderer import ParticleRenderer
+        renderer = ParticleRenderer(meta["width"], meta["height"], args.resolution,
+                                    meta.get("particleRadius", 0.2), colourBy="speed")
+        size = (meta["width"] * args.resolution, meta["height"] * args.resolution)
+    else:
+        _, shape = available["density"]
+        cells = shape[::-1] if "width" in meta else shape
+        size = (cells[0] * args.resolution, cells[1] * args.resolution)
+
+    pygame.init()
+    screen = pygame.display.set_mode(size)
+
+    for step, arrays in client:
+        if any(event.type == pygame.QUIT for event in pygame.event.get()):
+            break
+        if args.field == "particles":
+            renderer.draw(screen, SimpleNamespace(width=meta["width"], numCells=meta["width"] * meta["height"], **arrays))
+        else:
+            surface = pygame.surfarray.make_surface(densityImage(arrays["density"], meta))
+            screen.blit(pygame.transform.scale(surface, size), (0, 0))
+        pygame.display.set_caption("step %d  dropped %d" % (step, client.dropped))
+        pygame.display.flip()
+
+    client.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,25 @@
-from water3 import Fluid
-import pygame
+import argparse
+
+from fluidsim.waterNumpy import Fluid
+from fluidsim.particleRenderer import ParticleRenderer
+
+# what the renderer reads from the fluid
+frameFields = ("particleX", "particleY", "particleU", "particleV", "density", "width", "numCells")
+
+def close(*outputs):
+    for output in outputs:
+        if output is not None:
+            output.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Particle water in a pygame window.")
+    parser.add_argument("--threaded", action="store_true",
+                        help="step the simulation in its own thread and draw the latest frame")
+    parser.add_argument("--record", help="also record every step to this file, see replay.py")
+    parser.add_argument("--serve", type=int, help="also publish every step on this local port, see watch.py")
+    parser.add_argument("--fps", type=int, default=60, help="render rate cap with --threaded")
+    args = parser.parse_args(argv)
 
-def main():
     resolution = 20
     width = 60
     height = 20
@@ -10,25 +28,59 @@ def main():
     dt = 0.5
     numParticles = 3000
     incompressibilityIters = 30
-    f = Fluid(width, height, gravity, dt, numParticles, incompressibilityIters)
+    f = Fluid(width, height, gravity, dt, numParticles, incompressibilityIters, particleRadius=particleRadius)
+    renderer = ParticleRenderer(width, height, resolution, particleRadius, colourBy="speed")
+
+    step = f.sim
+    recorder = None
+    if args.record:
+        from fluidsim.recording import Recorder, particleFields, gridFields
+        recorder = Recorder(args.record, f, particleFields + gridFields,
+                            meta={"width": width, "height": height, "particleRadius": particleRadius})
+
+    server = None
+    if args.serve is not None:
+        from fluidsim.frameServer import FrameServer
+        server = FrameServer(f, frameFields[:5], port=args.serve, shapes={"density": (height, width)},
+                             meta={"width": width, "height": height, "particleRadius": particleRadius})
+        print("serving frames on port %d" % server.port)
+
+    if recorder is not None or server is not None:
+        def step():
+            f.sim()
+            if recorder is not None:
+                recorder.record()
+            if server is not None:
+                server.publish()
+
+    if args.threaded:
+        from fluidsim.viewer import runViewer
+        rates = runViewer(step, f, frameFields, renderer.draw, (width * resolution, height * resolution),
+                          caption="WE LOVE LULU", fps=args.fps)
+        print("%.1f steps/sec, %.1f frames/sec" % (rates["simulationRate"], rates["renderRate"]))
+        close(recorder, server)
+        return
+
+    import pygame
 
-    
     pygame.init()
     screen = pygame.display.set_mode((width * resolution, height * resolution))
     pygame.display.set_caption("WE LOVE LULU")
 
     running = True
     while running:
-        screen.fill((0,0,0))
-
-        f.sim()
-        for p in range(numParticles):
-            pygame.draw.circle(screen, (150,200,255), (int(f.particleX[p] * resolution), int(f.particleY[p] * resolution)), particleRadius * resolution)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+        step()
+        renderer.draw(screen, f)
         pygame.display.flip()
 
         #print("Frame")        
         #if input("frame:") == "q":
         #   running = False
     pygame.quit()
+    close(recorder, server)
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file